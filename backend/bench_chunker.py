@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Compare the old char-based chunker with the token-aware one on a document.
+
+    python bench_chunker.py policy.pdf [--queries qa.jsonl] [--max-tokens 800] [--overlap 80] [-k 4]
+
+Prints chunk counts and real-token size stats for both chunkers. With
+--queries (JSONL of {"question": ..., "answer": ...}, where "answer" is a
+snippet that appears in the document) it also embeds the chunks with
+OpenAI and reports the top-k retrieval hit rate of each chunker.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import time
+
+import numpy as np
+from dotenv import load_dotenv
+
+from utils.chunker import TokenCounter, iter_char_chunks, iter_token_chunks, normalize_ws
+
+load_dotenv()
+EMBED_MODEL = "text-embedding-3-small"
+
+
+def load_pieces(path: str) -> list[str]:
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".pdf":
+        from utils.pdf_extract import iter_pdf_pages
+        return list(iter_pdf_pages(path))
+    with open(path, "r", encoding="utf-8") as f:
+        if ext == ".json":
+            data = json.load(f)
+            return [json.dumps(e, ensure_ascii=False) for e in (data if isinstance(data, list) else [data])]
+        if ext == ".jsonl":
+            return [line.strip() for line in f if line.strip()]
+        return [f.read()]
+
+
+def embed(client, texts: list[str]) -> np.ndarray:
+    out = []
+    for i in range(0, len(texts), 96):
+        resp = client.embeddings.create(model=EMBED_MODEL, input=texts[i:i + 96])
+        out.extend(d.embedding for d in sorted(resp.data, key=lambda d: d.index))
+    mat = np.asarray(out, dtype=np.float32)
+    return mat / np.linalg.norm(mat, axis=1, keepdims=True)
+
+
+def hit_rate(client, chunks: list[str], queries: list[dict], k: int) -> float:
+    mat = embed(client, chunks)
+    qmat = embed(client, [q["question"] for q in queries])
+    hits = 0
+    for q, qv in zip(queries, qmat):
+        top = np.argsort(-(mat @ qv))[:k]
+        answer = normalize_ws(q["answer"]).lower()
+        hits += any(answer in normalize_ws(chunks[i]).lower() for i in top)
+    return hits / len(queries)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("path")
+    ap.add_argument("--queries")
+    ap.add_argument("--max-tokens", type=int, default=800)
+    ap.add_argument("--overlap", type=int, default=80)
+    ap.add_argument("-k", type=int, default=4)
+    args = ap.parse_args()
+
+    pieces = load_pieces(args.path)
+    counter = TokenCounter()
+    queries = []
+    if args.queries:
+        with open(args.queries, "r", encoding="utf-8") as f:
+            queries = [json.loads(line) for line in f if line.strip()]
+    client = None
+    if queries:
+        from openai import OpenAI
+        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+    chunkers = {
+        "char": lambda: iter_char_chunks(pieces, max_tokens=args.max_tokens),
+        "token": lambda: iter_token_chunks(pieces, max_tokens=args.max_tokens, overlap=args.overlap, counter=counter),
+    }
+    for label, make in chunkers.items():
+        t0 = time.perf_counter()
+        chunks = list(make())
+        elapsed = time.perf_counter() - t0
+        sizes = [counter.count(c) for c in chunks] or [0]
+        over = sum(s > args.max_tokens for s in sizes)
+        line = (f"{label:>5}: {len(chunks):5d} chunks  tokens total={sum(sizes)} "
+                f"mean={statistics.mean(sizes):.0f} min={min(sizes)} max={max(sizes)} "
+                f"over_budget={over}  {elapsed * 1000:.0f} ms")
+        if client and chunks:
+            line += f"  hit@{args.k}={hit_rate(client, chunks, queries, args.k):.2%}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,10 +4,15 @@ from __future__ import annotations
 
 import io
 import os
-import re
+import csv
 import time
 import json
 import uuid
+import hashlib
+import random
+import tempfile
+import threading
+import multiprocessing
 import bcrypt
 import cloudinary
 import requests
@@ -15,24 +20,32 @@ import numpy as np
 import pycountry
 from bson import ObjectId
 from dotenv import load_dotenv
-from datetime import datetime
-from pypdf import PdfReader            # PDF text extraction
+from datetime import datetime, timedelta
+from collections import Counter, defaultdict, deque
+from functools import lru_cache
+from typing import Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from flask import (
     Flask, request, render_template, redirect, url_for,
-    session, jsonify
+    session, jsonify, Response, stream_with_context
 )
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateOne
 import cloudinary.uploader
-from openai import OpenAI
-from langchain.vectorstores import FAISS
-from langchain.embeddings import OpenAIEmbeddings
-from langchain.docstore.document import Document
-from PyPDF2 import PdfReader
-import json
-
-# Initialize embeddings + vector store
-embeddings = OpenAIEmbeddings(openai_api_key=os.getenv("OPENAI_API_KEY"))
-vector_store = None  # Will store indexed documents
+from openai import OpenAI, RateLimitError, APIConnectionError, APITimeoutError, InternalServerError
+from utils.vector_index import VectorIndex, make_backend, file_lock
+from utils.embedding_cache import EmbeddingCache, cache_key
+from utils.keyed_workers import KeyedWorkerPool
+from utils.telegram_client import TelegramClient
+from utils.telegram_queue import TelegramSendQueue, PRIORITY_INTERACTIVE, PRIORITY_BULK
+from utils.images import prepare_photo
+from utils.mongo_indexes import ensure_indexes, verify_plans
+from utils.session_cache import SessionCache, SessionConflict
+from utils.pdf_extract import iter_pdf_pages
+from utils.chunker import TokenCounter, iter_token_chunks
+from utils.context_packer import pack_context, PackStats
+from utils.lexical_index import BM25Index, reciprocal_rank_fusion
+from utils.answer_cache import SemanticAnswerCache
+from utils.telegram_stream import TelegramStreamWriter
 # =========================
 # Boot / Config
 # =========================
@@ -67,13 +80,48 @@ app.config["SESSION_COOKIE_SECURE"] = True
 # Mongo
 MONGO_URI = os.getenv("MONGODB_URI")
 PORT = int(os.getenv("PORT", 10000))
-client = MongoClient(MONGO_URI)
+# connect=False: no monitor threads until first use (pool workers re-import this module)
+client = MongoClient(MONGO_URI, connect=False)
 db = client["CuteStarsDB"]
 applications_collection = db["applications"]
 users_collection = db["admin_users"]
 knowledge_collection = db["knowledge"]          # flat rows: one record per chunk
+knowledge_docs_coll = db["knowledge_docs"]      # { _id: doc_id, name, kind, size, chunks, created_at, updated_at }
 sessions_coll = db["bot_sessions"]              # { chat_id, state, language, email, updated_at }
 settings_collection = db["settings"]            # { webhook_enabled, bot_main_url, bot_alt_url }
+telegram_outbox = db["telegram_outbox"]         # undelivered Telegram calls { method, payload, status, ... }
+embedding_cache_coll = db["embedding_cache"]    # { _id: sha256(model, text), model, embedding, last_used }
+ingest_jobs_coll = db["ingest_jobs"]            # { _id: job id, name, kind, stage, progress counters, expires_at }
+
+# Indexes for every hot lookup; created idempotently at boot, then each hot
+# query is explain()ed to confirm an IXSCAN (report at /debug/indexes).
+MONGO_INDEXES = [
+    (applications_collection, [("email", 1)], {}),
+    (applications_collection, [("telegram_id", 1)], {}),
+    (applications_collection, [("status", 1), ("_id", -1)], {}),
+    (applications_collection, [("country", 1), ("_id", -1)], {}),
+    (sessions_coll, [("chat_id", 1)], {"unique": True}),
+    (knowledge_collection, [("doc_id", 1), ("chunk_index", 1)], {}),
+    (knowledge_docs_coll, [("name", 1), ("kind", 1)], {}),
+    (users_collection, [("username", 1)], {"unique": True}),
+    (telegram_outbox, [("status", 1)], {}),
+    (ingest_jobs_coll, [("expires_at", 1)], {"expireAfterSeconds": 0}),
+]
+HOT_QUERIES = [
+    ("application by email", applications_collection, {"email": "probe@example.com"}),
+    ("application by telegram_id", applications_collection, {"telegram_id": 0}),
+    ("session by chat_id", sessions_coll, {"chat_id": 0}),
+    ("knowledge by doc_id", knowledge_collection, {"doc_id": "probe"}),
+    ("admin by username", users_collection, {"username": "probe"}),
+]
+index_report: list[dict] = []
+
+def bootstrap_indexes():
+    try:
+        ensure_indexes(MONGO_INDEXES)
+        index_report[:] = verify_plans(HOT_QUERIES)
+    except Exception as e:
+        print("Index bootstrap failed:", e)
 
 # Cloudinary
 cloudinary.config(
@@ -93,8 +141,16 @@ APP_URL_IOS     = "https://apps.apple.com/sa/app/halo-meditation-sleep/id1668970
 SIGNUP_VIDEO    = "https://youtube.com/shorts/COPJyTKqthI?si=B-ZSom5UOoUJWZsV"
 ADMIN_CHAT_ID   = int(os.getenv("TELEGRAM_CHAT_ID", "0"))
 
-# In-memory doc list for admin table (metadata only)
-DOCS: dict[str, dict] = {}
+# All outbound Bot API traffic goes through one pooled keep-alive client,
+# fronted by a rate-limited send queue (global + per-chat token buckets,
+# applicant replies ahead of bulk admin traffic).
+telegram = TelegramClient(os.getenv("TELEGRAM_BOT_TOKEN", ""))
+telegram_queue = TelegramSendQueue(
+    telegram,
+    store=telegram_outbox,
+    global_rate=float(os.getenv("TG_GLOBAL_RATE", "30")),
+    chat_rate=float(os.getenv("TG_CHAT_RATE", "1")),
+)
 
 # =========================
 # Guards
@@ -111,117 +167,484 @@ def guard_knowledge_routes():
 # =========================
 EMBED_MODEL = "text-embedding-3-small"
 
-def _normalize_ws(s: str) -> str:
-    return re.sub(r"\s+", " ", (s or "")).strip()
-
-def chunk_text(text: str, max_tokens: int = 800) -> list[str]:
-    """Rough char-based chunker (≈4 chars/token)."""
-    text = _normalize_ws(text)
-    max_chars = max_tokens * 4
-    out, i, n = [], 0, len(text)
-    while i < n:
-        j = min(n, i + max_chars)
-        cut = text.rfind(". ", i, j)
-        if cut == -1 or cut < i + int(max_chars * 0.6):
-            cut = j
-        out.append(text[i:cut].strip())
-        i = cut
-    return [c for c in out if c]
+# Chunks are measured in real tokens of the embedding model's encoding.
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "800"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "80"))
+token_counter = TokenCounter(os.getenv("CHUNK_ENCODING", "cl100k_base"))
+
+def iter_chunks(texts: Iterable[str], max_tokens: int = CHUNK_MAX_TOKENS) -> Iterator[str]:
+    """Token-aware, structure-preserving chunks over a stream of texts (e.g. PDF pages)."""
+    return iter_token_chunks(texts, max_tokens=max_tokens, overlap=CHUNK_OVERLAP_TOKENS, counter=token_counter)
+
+def chunk_text(text: str, max_tokens: int = CHUNK_MAX_TOKENS) -> list[str]:
+    return list(iter_chunks([text], max_tokens=max_tokens))
+
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "96"))      # inputs per embeddings request
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))     # batches in flight at once
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "5"))
+_EMBED_RETRYABLE = (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError)
+
+def _embed_batch(batch: list[str]) -> list[list[float]]:
+    """One `input=[...]` request, retried with exponential backoff on 429/5xx/network errors."""
+    delay = 1.0
+    for attempt in range(EMBED_MAX_RETRIES):
+        try:
+            resp = openai_client.embeddings.create(model=EMBED_MODEL, input=batch)
+            return [d.embedding for d in sorted(resp.data, key=lambda d: d.index)]
+        except _EMBED_RETRYABLE as e:
+            if attempt == EMBED_MAX_RETRIES - 1:
+                raise
+            retry_after = getattr(getattr(e, "response", None), "headers", {}).get("retry-after")
+            try:
+                wait = float(retry_after)
+            except (TypeError, ValueError):
+                wait = delay + random.uniform(0, delay / 2)
+            print(f"Embeddings retry {attempt + 1}/{EMBED_MAX_RETRIES} in {wait:.1f}s:", e)
+            time.sleep(wait)
+            delay *= 2
+
+def _embed_uncached(texts: list[str]) -> list[list[float]]:
+    """Embed many texts in EMBED_BATCH_SIZE requests, EMBED_CONCURRENCY at a time (order preserved)."""
+    batches = [texts[i:i + EMBED_BATCH_SIZE] for i in range(0, len(texts), EMBED_BATCH_SIZE)]
+    if len(batches) <= 1:
+        return _embed_batch(batches[0]) if batches else []
+    out: list[list[float]] = []
+    with ThreadPoolExecutor(max_workers=min(EMBED_CONCURRENCY, len(batches))) as pool:
+        for embs in pool.map(_embed_batch, batches):
+            out.extend(embs)
+    return out
+
+# Single embedding layer: LRU in memory + Mongo tier (TTL-evicted), keyed by
+# sha256(model, normalized text). Stats at /debug/embedding-cache.
+embedding_cache = EmbeddingCache(
+    embedding_cache_coll,
+    max_items=int(os.getenv("EMBED_CACHE_SIZE", "5000")),
+    ttl_days=int(os.getenv("EMBED_CACHE_TTL_DAYS", "30")),
+)
+
+def get_embeddings(texts: list[str]) -> list[list[float]]:
+    """Cached embeddings for `texts`; only unseen (model, text) pairs hit the API."""
+    keys = [cache_key(EMBED_MODEL, t) for t in texts]
+    found = embedding_cache.get_many(keys)
+    todo: dict[str, str] = {}
+    for k, t in zip(keys, texts):
+        if k not in found:
+            todo.setdefault(k, t)
+    if todo:
+        fresh = dict(zip(todo, _embed_uncached(list(todo.values()))))
+        embedding_cache.put_many(EMBED_MODEL, fresh)
+        found.update(fresh)
+    return [found[k] for k in keys]
 
 def get_embedding(text: str) -> list[float]:
-    return openai_client.embeddings.create(model=EMBED_MODEL, input=text).data[0].embedding
+    return get_embeddings([text])[0]
+
+# The knowledge store: Mongo `knowledge_collection` is the source of truth and
+# every write goes through index_into_vector_store / delete_knowledge_doc.
+# Search is served by a resident embedding index persisted in
+# KNOWLEDGE_INDEX_DIR (JSON manifest + memory-mapped .npy matrix + lock
+# files; kept apart from UPLOAD_FOLDER, whose names clients choose), so all
+# worker processes map one copy; a worker that sees a newer version on disk
+# (checked every KNOWLEDGE_REFRESH_SECONDS) reloads it.
+#   KNOWLEDGE_INDEX_BACKEND = "ivf" (ANN, exact below ~2k rows) | "flat" (exact)
+#   KNOWLEDGE_IVF_NPROBE    = buckets scanned per query (higher = better recall, slower)
+KNOWLEDGE_INDEX_DIR = os.getenv("KNOWLEDGE_INDEX_DIR", "knowledge_index")
+os.makedirs(KNOWLEDGE_INDEX_DIR, exist_ok=True)
+KNOWLEDGE_INDEX_PATH = os.path.join(KNOWLEDGE_INDEX_DIR, "knowledge_index.json")
+KNOWLEDGE_REFRESH_SECONDS = float(os.getenv("KNOWLEDGE_REFRESH_SECONDS", "2"))
+knowledge_index = VectorIndex(make_backend(
+    os.getenv("KNOWLEDGE_INDEX_BACKEND", "ivf"),
+    nprobe=int(os.getenv("KNOWLEDGE_IVF_NPROBE", "8")),
+), meta_fields=("text", "name", "doc_id", "generation"))
+
+# BM25 over the same chunk texts, derived from the resident index's rows; it
+# needs no embedding, so retrieval still works when the embeddings API does not.
+lexical_index = BM25Index()
+
+def _populate_lexical_index(index: BM25Index):
+    knowledge_index.ensure_loaded(_populate_knowledge_index)
+    index.reset(knowledge_index.rows())
+
+def _fingerprint(groups: Iterable[tuple]) -> str:
+    """Order-independent digest of (doc_id, generation, row count) groups."""
+    return hashlib.sha256(json.dumps(sorted(groups, key=str), default=str).encode("utf-8")).hexdigest()
+
+def _committed_generations() -> dict:
+    """doc_id → generation its metadata row names (None for docs indexed before generations)."""
+    return {d["_id"]: d.get("generation") for d in knowledge_docs_coll.find({}, {"generation": 1})}
+
+def _is_committed(committed: dict, doc_id, generation) -> bool:
+    # rows of a re-index still in progress are in Mongo before the doc points at them
+    current = committed.get(doc_id)
+    return current is None or current == generation
+
+def _knowledge_fingerprint_mongo() -> str:
+    committed = _committed_generations()
+    return _fingerprint(
+        (g["_id"].get("d"), g["_id"].get("g"), g["n"])
+        for g in knowledge_collection.aggregate([
+            {"$group": {"_id": {"d": "$doc_id", "g": "$generation"}, "n": {"$sum": 1}}},
+        ])
+        if _is_committed(committed, g["_id"].get("d"), g["_id"].get("g"))
+    )
+
+def _knowledge_fingerprint_index(index: VectorIndex) -> str:
+    counts = Counter((r.get("doc_id"), r.get("generation")) for r in index.rows())
+    return _fingerprint((d, g, n) for (d, g), n in counts.items())
+
+def _populate_knowledge_index(index: VectorIndex):
+    with file_lock(KNOWLEDGE_INDEX_PATH):
+        # Trust the on-disk snapshot only if it holds exactly the doc versions Mongo has
+        if (index.load_file(KNOWLEDGE_INDEX_PATH)
+                and _knowledge_fingerprint_index(index) == _knowledge_fingerprint_mongo()):
+            return
+        committed = _committed_generations()
+        index.reset(
+            row for row in knowledge_collection.find({}, {"text": 1, "embedding": 1, "name": 1, "doc_id": 1, "generation": 1})
+            if _is_committed(committed, row.get("doc_id"), row.get("generation"))
+        )
+        _save_knowledge_index()
+
+def _save_knowledge_index():
+    try:
+        knowledge_index.save(KNOWLEDGE_INDEX_PATH)
+    except Exception as e:
+        print("Knowledge index save failed:", e)
 
-def index_into_vector_store(*, doc_id: str, name: str, kind: str, text: str) -> int:
+def refresh_knowledge(min_interval: float = KNOWLEDGE_REFRESH_SECONDS):
+    """Pick up index versions saved by other workers (and drop caches derived from the old one)."""
+    if knowledge_index.refresh(KNOWLEDGE_INDEX_PATH, min_interval=min_interval):
+        if lexical_index.loaded:
+            lexical_index.reset(knowledge_index.rows())
+        _on_knowledge_changed()
+
+def _sync_knowledge_index(doc_id: str, rows: list[dict] | None = None, commit=None):
+    """
+    Mirror a doc_id replace/delete in Mongo into the resident indexes and the
+    shared file. `commit()` makes the change in Mongo; it runs under the same
+    file lock, so _populate_knowledge_index in another worker never
+    snapshots a half-applied change.
+    """
+    knowledge_index.ensure_loaded(_populate_knowledge_index)
+    with file_lock(KNOWLEDGE_INDEX_PATH):
+        if commit:
+            commit()
+        refresh_knowledge(min_interval=0)   # apply on top of other workers' writes
+        knowledge_index.replace(lambda m: m.get("doc_id") == doc_id, rows or [])
+        _save_knowledge_index()
+    if lexical_index.loaded:
+        lexical_index.replace(lambda m: m.get("doc_id") == doc_id, rows or [])
+    _on_knowledge_changed()
+
+def embed_chunk_stream(chunks: Iterable[str], on_batch=None) -> Iterator[tuple[list[str], np.ndarray]]:
+    """
+    Embed a lazily produced chunk stream: every EMBED_BATCH_SIZE chunks are
+    submitted as soon as they exist, so embedding overlaps extraction.
+    Yields (chunks, float32 matrix) per batch, in order, as batches finish;
+    at most EMBED_CONCURRENCY batches are held at once.
+    `on_batch(n)` is called as each batch of n chunks finishes.
+    """
+    submitted: deque = deque()
+    batch: list[str] = []
+
+    def submit(pool, b):
+        fut = pool.submit(get_embeddings, b)
+        if on_batch:
+            fut.add_done_callback(lambda f, n=len(b): f.exception() or on_batch(n))
+        submitted.append((b, fut))
+
+    def done(b, fut):
+        return b, np.asarray(fut.result(), dtype=np.float32)
+
+    with ThreadPoolExecutor(max_workers=EMBED_CONCURRENCY) as pool:
+        for ch in chunks:
+            batch.append(ch)
+            if len(batch) == EMBED_BATCH_SIZE:
+                submit(pool, batch)
+                batch = []
+                if len(submitted) > EMBED_CONCURRENCY:
+                    yield done(*submitted.popleft())
+        if batch:
+            submit(pool, batch)
+        while submitted:
+            yield done(*submitted.popleft())
+
+def doc_lock(doc_id: str):
+    """Cross-process lock serializing every write to one doc_id."""
+    key = hashlib.sha1(doc_id.encode("utf-8")).hexdigest()[:16]
+    return file_lock(os.path.join(KNOWLEDGE_INDEX_DIR, f"doc-{key}"))
+
+def delete_knowledge_doc(doc_id: str) -> bool:
+    """Remove a document's chunks and metadata; False if it does not exist."""
+    found = False
+
+    def commit():
+        nonlocal found
+        res = knowledge_docs_coll.delete_one({"_id": doc_id})
+        removed = knowledge_collection.delete_many({"doc_id": doc_id}).deleted_count
+        found = bool(res.deleted_count or removed)
+
+    with doc_lock(doc_id):
+        _sync_knowledge_index(doc_id, commit=commit)
+    return found
+
+def backfill_knowledge_docs():
+    """Create metadata rows for docs indexed before knowledge_docs existed."""
+    try:
+        known = set(knowledge_docs_coll.distinct("_id"))
+        for d in knowledge_collection.aggregate([
+            {"$group": {"_id": "$doc_id", "name": {"$first": "$name"}, "kind": {"$first": "$kind"},
+                        "chunks": {"$sum": 1}, "created_at": {"$min": "$created_at"}}},
+        ]):
+            if d["_id"] not in known:
+                knowledge_docs_coll.update_one(
+                    {"_id": d["_id"]},
+                    {"$setOnInsert": {"name": d["name"], "kind": d["kind"], "size": 0, "chunks": d["chunks"],
+                                      "created_at": d["created_at"], "updated_at": d["created_at"]}},
+                    upsert=True,
+                )
+    except Exception as e:
+        print("Knowledge docs backfill failed:", e)
+
+def knowledge_doc_id(name: str, kind: str) -> str:
+    """Re-uploads of the same file name replace (and re-diff) the existing doc."""
+    doc = knowledge_docs_coll.find_one({"name": name, "kind": kind}, {"_id": 1})
+    return doc["_id"] if doc else f"{kind}-{uuid.uuid4()}"
+
+def chunk_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def index_into_vector_store(*, doc_id: str, name: str, kind: str, text: str | Iterable[str],
+                            size: int = 0, job: dict | None = None) -> int:
     """
-    Split `text` -> embed each chunk -> save flat rows into Mongo.
-    Returns number of chunks written.
+    Split `text` (a string or a stream of page texts) into chunks and diff
+    them against the rows already stored for `doc_id` by content hash:
+    unchanged chunks are kept (only their position is updated), new ones
+    are embedded and inserted, vanished ones are deleted. The new version
+    is written under a fresh `generation` before the old rows go, and the
+    resident index swaps the doc in one step, so search never sees a
+    half-indexed document. Raises ValueError if `text` yields no chunks.
+    Returns number of chunks in the new version;
+    the doc's metadata row in `knowledge_docs_coll` is upserted alongside.
+    Progress is reported into `job` (see start_ingest_job) when given.
+
+    Runs under doc_lock(doc_id): concurrent re-indexes of one doc would
+    otherwise delete each other's generation.
     """
-    chunks = chunk_text(text, max_tokens=800)
-    if not chunks:
-        return 0
-
-    rows = []
-    for i, ch in enumerate(chunks):
-        emb = get_embedding(ch)
-        rows.append({
+    with doc_lock(doc_id):
+        return _index_doc(doc_id=doc_id, name=name, kind=kind, text=text, size=size, job=job)
+
+def _index_doc(*, doc_id: str, name: str, kind: str, text: str | Iterable[str],
+               size: int, job: dict | None) -> int:
+    existing: dict[str, list[dict]] = defaultdict(list)
+    for row in knowledge_collection.find({"doc_id": doc_id}, {"chunk_hash": 1, "text": 1, "embedding": 1}).sort("chunk_index", 1):
+        row["embedding"] = np.asarray(row.get("embedding") or [], dtype=np.float32)
+        existing[row.get("chunk_hash") or chunk_hash(row.get("text", ""))].append(row)
+
+    generation = uuid.uuid4().hex
+    now = datetime.utcnow()
+    rows: list[dict] = []        # the new version in order; embeddings stay float32
+    updates: list[UpdateOne] = []
+    inserted = 0
+
+    def base_row(i, h, ch):
+        return {
             "doc_id": doc_id,
             "name": name,
             "kind": kind,
             "chunk_index": i,
+            "chunk_hash": h,
             "text": ch,
-            "embedding": emb,
-            "created_at": datetime.utcnow(),
+            "generation": generation,
             # language-agnostic knowledge
             "language": "all",
-        })
+        }
 
-    # Replace previous version of this doc_id if any
-    knowledge_collection.delete_many({"doc_id": doc_id})
-    knowledge_collection.insert_many(rows)
+    def fresh_chunks(chunks):
+        for ch in chunks:
+            h = chunk_hash(ch)
+            kept = existing[h].pop(0) if existing.get(h) else None
+            row = base_row(len(rows), h, ch)
+            rows.append(row)
+            if kept is None:
+                yield ch
+            else:
+                row.update(_id=kept["_id"], embedding=kept["embedding"])
+                updates.append(UpdateOne({"_id": kept["_id"]}, {"$set": {
+                    "name": name, "kind": kind, "chunk_index": row["chunk_index"],
+                    "chunk_hash": h, "generation": generation}}))
+
+    pieces = [text] if isinstance(text, str) else text
+    chunks = iter_chunks(pieces)
+    on_batch = None
+    if job is not None:
+        _job_update(job, stage="embedding")
+        chunks = _counting(chunks, job, "chunks")
+        on_batch = lambda n: _job_incr(job, "embedded", n)
+
+    # New chunks are written under the new generation batch by batch as they
+    # are embedded; until the metadata row below names that generation,
+    # readers keep using the old one.
+    pending = (r for r in rows if "embedding" not in r)   # new rows, in embedding order
+    try:
+        for _, mat in embed_chunk_stream(fresh_chunks(chunks), on_batch=on_batch):
+            inserts = []
+            for vec in mat:
+                row = next(pending)
+                row["embedding"] = vec
+                inserts.append({**row, "embedding": vec.tolist(), "created_at": now})
+            res = knowledge_collection.insert_many(inserts)
+            for row, _id in zip(inserts, res.inserted_ids):
+                rows[row["chunk_index"]]["_id"] = _id
+            inserted += len(inserts)
+    except BaseException:
+        knowledge_collection.delete_many({"doc_id": doc_id, "generation": generation})
+        raise
+    if not rows:
+        # keep the previous version indexed, but fail the job so the admin sees it
+        raise ValueError(f"No text could be extracted from {name}; nothing was indexed")
+
+    def commit():
+        # Kept rows change generation before the metadata row names it; the
+        # index file lock keeps other workers from snapshotting in between.
+        if updates:
+            knowledge_collection.bulk_write(updates, ordered=False)
+        knowledge_docs_coll.update_one(
+            {"_id": doc_id},
+            {"$set": {"name": name, "kind": kind, "size": size, "chunks": len(rows),
+                      "generation": generation, "updated_at": now},
+             "$setOnInsert": {"created_at": now}},
+            upsert=True,
+        )
+        # the doc now points at the new generation: drop whatever is left of the old one
+        knowledge_collection.delete_many({"doc_id": doc_id, "generation": {"$ne": generation}})
+
+    if job is not None:
+        _job_update(job, stage="writing")
+    _sync_knowledge_index(doc_id, rows, commit=commit)
+    if job is not None:
+        _job_update(job, kept=len(updates), added=inserted,
+                    removed=sum(len(v) for v in existing.values()))
     return len(rows)
 
-def search_knowledge(query: str, k: int = 6) -> list[dict]:
-    """Cosine similarity over flat rows in `knowledge_collection`."""
-    qv = np.array(get_embedding(query), dtype=np.float32)
-    scored: list[tuple[float, dict]] = []
-    # NOTE: paginate in production; this grabs first 2k rows for speed
-    for row in knowledge_collection.find({}, {"_id": 0, "text": 1, "embedding": 1}).limit(2000):
-        v = np.array(row.get("embedding", []), dtype=np.float32)
-        if v.size == 0:
-            continue
-        sim = float(np.dot(qv, v) / (np.linalg.norm(qv) * np.linalg.norm(v) + 1e-9))
-        scored.append((sim, row))
-    scored.sort(key=lambda x: x[0], reverse=True)
-    return [row for _, row in scored[:k]]
+# Query embeddings get a deadline; after a failure the API is skipped for a
+# cooldown and retrieval runs lexical-only.
+RAG_EMBED_TIMEOUT = float(os.getenv("RAG_EMBED_TIMEOUT", "3"))
+RAG_EMBED_COOLDOWN = float(os.getenv("RAG_EMBED_COOLDOWN", "30"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+RAG_MIN_BM25 = float(os.getenv("RAG_MIN_BM25", "1.0"))
+query_embed_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="qembed")
+_embed_down_until = 0.0
+
+def embed_query(text: str) -> list[float] | None:
+    """Embedding of a search query, or None if the API is failing or too slow."""
+    global _embed_down_until
+    if time.monotonic() < _embed_down_until:
+        return None
+    try:
+        return query_embed_pool.submit(get_embedding, text).result(timeout=RAG_EMBED_TIMEOUT)
+    except Exception as e:
+        print(f"Query embedding unavailable, using lexical search for {RAG_EMBED_COOLDOWN:.0f}s:", e or type(e).__name__)
+        _embed_down_until = time.monotonic() + RAG_EMBED_COOLDOWN
+        return None
 
-def build_context_for_intro() -> str:
-    docs = search_knowledge("overview, role, pay, onboarding, policies", k=6)
-    return "\n\n".join(d["text"] for d in docs)
+def hybrid_search(query: str, k: int = 6, query_vec=None, min_score: float = 0.0) -> list[tuple]:
+    """
+    Vector (cosine ≥ min_score) and BM25 (≥ RAG_MIN_BM25) hits, ranked by
+    reciprocal rank fusion → [(relevance 0..1, meta, unit vector or None),
+    ...]. Relevance is the better of the hit's cosine and its BM25 score
+    relative to the best lexical hit, so callers can threshold it. Falls
+    back to BM25 alone when no query embedding is available.
+    """
+    knowledge_index.ensure_loaded(_populate_knowledge_index)
+    lexical_index.ensure_loaded(_populate_lexical_index)
+    refresh_knowledge()
+    if query_vec is None:
+        query_vec = embed_query(query)
+    vector_hits = []
+    if query_vec is not None and len(knowledge_index):
+        vector_hits = [h for h in knowledge_index.search(query_vec, k=k, with_vectors=True) if h[0] >= min_score]
+    lexical_hits = [(score, meta, None) for score, meta in lexical_index.search(query, k=k, min_score=RAG_MIN_BM25)]
+
+    def key(h):
+        return h[1].get("doc_id"), h[1].get("text")
+
+    relevance: dict = defaultdict(float)
+    for score, meta, _ in vector_hits:
+        relevance[key((score, meta))] = score
+    if lexical_hits:
+        top_bm25 = lexical_hits[0][0]
+        for score, meta, _ in lexical_hits:
+            kk = key((score, meta))
+            relevance[kk] = max(relevance[kk], score / top_bm25)
+    fused = reciprocal_rank_fusion([vector_hits, lexical_hits], key=key, k=RRF_K)[:k]
+    return [(relevance[key(h)], h[1], h[2]) for h in fused]
 
-def build_context_for_question(question: str) -> str:
-    docs = search_knowledge(question, k=6)
-    return "\n\n".join(d["text"] for d in docs)
+def search_knowledge(query: str, k: int = 6) -> list[dict]:
+    """Hybrid (vector + BM25) search over the resident knowledge indexes → top-k rows."""
+    return [{"score": score, "text": m.get("text", ""), "name": m.get("name"), "doc_id": m.get("doc_id")}
+            for score, m, _ in hybrid_search(query, k=k)]
 
 # =========================
 # Misc helpers
 # =========================
-def country_to_flag(country_name):
+def _flag_emoji(alpha_2: str) -> str:
+    return ''.join(chr(127397 + ord(c)) for c in alpha_2.upper())
+
+# Spellings applicants actually type that pycountry doesn't list verbatim
+COUNTRY_ALIASES = {
+    "usa": "US", "us": "US", "united states of america": "US", "america": "US",
+    "uk": "GB", "england": "GB", "great britain": "GB", "scotland": "GB", "wales": "GB",
+    "russia": "RU", "south korea": "KR", "korea": "KR", "north korea": "KP",
+    "vietnam": "VN", "iran": "IR", "syria": "SY", "venezuela": "VE", "bolivia": "BO",
+    "tanzania": "TZ", "moldova": "MD", "laos": "LA", "czech republic": "CZ",
+    "ivory coast": "CI", "cote d'ivoire": "CI", "kosovo": "XK", "macedonia": "MK",
+    "turkey": "TR", "brasil": "BR", "méxico": "MX", "españa": "ES", "srbija": "RS",
+    "россия": "RU", "україна": "UA", "беларусь": "BY", "казахстан": "KZ",
+}
+
+def _build_country_flags() -> dict[str, str]:
+    """casefolded name / official name / common name / ISO code → flag emoji."""
+    table: dict[str, str] = {}
+    for c in pycountry.countries:
+        flag = _flag_emoji(c.alpha_2)
+        for key in (c.name, getattr(c, "official_name", None), getattr(c, "common_name", None),
+                    c.alpha_2, c.alpha_3):
+            if key:
+                table[key.casefold()] = flag
+    for alias, code in COUNTRY_ALIASES.items():
+        table[alias.casefold()] = _flag_emoji(code)
+    return table
+
+COUNTRY_FLAGS = _build_country_flags()
+
+@lru_cache(maxsize=1024)
+def _fuzzy_country_flag(key: str) -> str:
     try:
-        if not country_name:
-            return ''
-        country = pycountry.countries.get(name=country_name)
-        if not country:
-            country = pycountry.countries.search_fuzzy(country_name)[0]
-        code = country.alpha_2
-        return ''.join(chr(127397 + ord(c)) for c in code.upper())
+        return _flag_emoji(pycountry.countries.search_fuzzy(key)[0].alpha_2)
     except Exception:
         return ''
 
-def tg_send_message(chat_id, text, reply_markup=None, parse_mode=None):
-    payload = {"chat_id": chat_id, "text": text}
-    if parse_mode:
-        payload["parse_mode"] = parse_mode
-    if reply_markup:
-        payload["reply_markup"] = reply_markup
-    try:
-        r = requests.post(
-            f"https://api.telegram.org/bot{os.getenv('TELEGRAM_BOT_TOKEN')}/sendMessage",
-            json=payload, timeout=15
-        )
-        return r.status_code, r.text
-    except Exception as e:
-        print("Telegram sendMessage error:", e)
-        return 500, str(e)
+def country_to_flag(country_name):
+    if not country_name:
+        return ''
+    key = str(country_name).strip().casefold()
+    flag = COUNTRY_FLAGS.get(key)
+    return flag if flag is not None else _fuzzy_country_flag(key)
+
+def tg_send_message(chat_id, text, reply_markup=None, parse_mode=None, priority=PRIORITY_INTERACTIVE):
+    """Queue a sendMessage; returns a Future resolving to (status_code, body)."""
+    return telegram_queue.send_message(chat_id, text, reply_markup=reply_markup,
+                                       parse_mode=parse_mode, priority=priority)
 
 def send_application_to_telegram(applicant, photo_urls=None):
-    token = os.getenv("TELEGRAM_BOT_TOKEN", "").strip()
-    chat_id = os.getenv("TELEGRAM_CHAT_ID", "").strip()
-    if not token or not chat_id:
+    chat_id = ADMIN_CHAT_ID
+    if not telegram.token or not chat_id:
         print("⚠️ Missing TELEGRAM_BOT_TOKEN or TELEGRAM_CHAT_ID; skipping Telegram notify.")
         return
 
     photo_urls = photo_urls or []
-    flag = country_to_flag(applicant.get("country"))
+    flag = applicant.get("country_flag") or country_to_flag(applicant.get("country"))
     msg = [
         "📥 *New Application Received*",
         "",
@@ -258,55 +681,79 @@ def send_application_to_telegram(applicant, photo_urls=None):
         msg.append("\n📍 *Browser Location:* Not shared")
 
     text = "\n".join(msg)
-    try:
-        r = requests.post(
-            f"https://api.telegram.org/bot{token}/sendMessage",
-            json={"chat_id": chat_id, "text": text, "parse_mode": "Markdown"},
-            timeout=15,
-        )
-        if r.status_code != 200:
-            print("❌ Telegram sendMessage error:", r.text)
-    except Exception as e:
-        print("❌ Telegram sendMessage exception:", e)
-
+    tg_send_message(chat_id, text, parse_mode="Markdown", priority=PRIORITY_BULK)
     if photo_urls:
-        group = [{"type": "photo", "media": u} for u in photo_urls[:10]]
-        try:
-            r2 = requests.post(
-                f"https://api.telegram.org/bot{token}/sendMediaGroup",
-                json={"chat_id": chat_id, "media": group},
-                timeout=20,
-            )
-            if r2.status_code != 200:
-                print("❌ Telegram sendMediaGroup error:", r2.text)
-        except Exception as e:
-            print("❌ Telegram sendMediaGroup exception:", e)
+        telegram_queue.send_media_group(chat_id, photo_urls)
+
+# Bot sessions are served from memory and written through to `sessions_coll`.
+# SESSION_CACHE_MODE=cas makes writes compare-and-set on a version field so
+# several worker processes can share the collection.
+session_cache = SessionCache(
+    sessions_coll,
+    max_items=int(os.getenv("SESSION_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("SESSION_CACHE_TTL", "600")),
+    mode=os.getenv("SESSION_CACHE_MODE", "local"),
+)
 
 def set_state(chat_id, **fields):
     fields["updated_at"] = datetime.utcnow()
-    sessions_coll.update_one(
-        {"chat_id": chat_id},
-        {"$set": fields, "$setOnInsert": {"chat_id": chat_id}},
-        upsert=True,
-    )
+    session_cache.set(chat_id, **fields)
 
 def get_state(chat_id):
-    return sessions_coll.find_one({"chat_id": chat_id}) or {}
+    return session_cache.get(chat_id)
 
 # =========================
 # Settings (ONE source of truth)
 # =========================
-def get_settings():
+# Process-local copy with a short TTL; api_save_settings invalidates it
+# immediately, other workers pick the change up within SETTINGS_CACHE_TTL.
+SETTINGS_CACHE_TTL = float(os.getenv("SETTINGS_CACHE_TTL", "30"))
+_settings_cache: dict = {"value": None, "version": 0, "expires": 0.0}
+_settings_lock = threading.Lock()
+
+def _load_settings():
     s = settings_collection.find_one({}, {"_id": 0}) or {}
-    return {
+    value = {
         "webhook_enabled": s.get("webhook_enabled", True),
         "bot_main_url": s.get("bot_main_url", "https://t.me/AiSiva_bot"),
         "bot_alt_url":  s.get("bot_alt_url",  "https://t.me/AlternateBot"),
     }
+    with _settings_lock:
+        _settings_cache.update(value=value, version=s.get("version", 0),
+                               expires=time.monotonic() + SETTINGS_CACHE_TTL)
+    return value
+
+def get_settings_versioned() -> tuple[dict, int]:
+    with _settings_lock:
+        value, version = _settings_cache["value"], _settings_cache["version"]
+        fresh = value is not None and time.monotonic() < _settings_cache["expires"]
+    if not fresh:
+        value = _load_settings()
+        with _settings_lock:
+            version = _settings_cache["version"]
+    return dict(value), version
+
+def get_settings():
+    return get_settings_versioned()[0]
+
+def invalidate_settings():
+    with _settings_lock:
+        _settings_cache["expires"] = 0.0
+
+PUBLIC_CACHE_CONTROL = os.getenv("PUBLIC_CACHE_CONTROL", "public, max-age=60, stale-while-revalidate=600")
+
+def _conditional_json(body: dict, version: int, cache_control: str):
+    """JSON response with a strong ETag (settings version + body digest); 304 on If-None-Match."""
+    digest = hashlib.sha1(json.dumps(body, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+    resp = jsonify(body)
+    resp.set_etag(f"s{version}-{digest}")
+    resp.headers["Cache-Control"] = cache_control
+    return resp.make_conditional(request)
 
 @app.route("/api/settings", methods=["GET"])
 def api_get_settings():
-    return jsonify(get_settings()), 200
+    s, version = get_settings_versioned()
+    return _conditional_json(s, version, "private, no-cache")
 
 @app.route("/api/settings", methods=["POST"])
 def api_save_settings():
@@ -319,16 +766,17 @@ def api_save_settings():
             "webhook_enabled": bool(data.get("webhook_enabled", True)),
             "bot_main_url": data.get("bot_main_url", "").strip(),
             "bot_alt_url":  data.get("bot_alt_url", "").strip(),
-        }},
+        }, "$inc": {"version": 1}},
         upsert=True
     )
+    invalidate_settings()
     return jsonify({"status": "ok"}), 200
 
 @app.route("/public/bot-link", methods=["GET"])
 def public_bot_link():
-    s = get_settings()
+    s, version = get_settings_versioned()
     url = s.get("bot_main_url") if s.get("webhook_enabled", True) else s.get("bot_alt_url")
-    return jsonify({"url": url}), 200
+    return _conditional_json({"url": url}, version, PUBLIC_CACHE_CONTROL)
 
 # =========================
 # Basic pages
@@ -358,17 +806,66 @@ def logout():
 def applications():
     if "user" not in session:
         return redirect(url_for("login"))
-    raw_data = list(applications_collection.find({}, {"_id": 0}))
-    for app_doc in raw_data:
-        try:
-            app_doc["country_flag"] = country_to_flag(app_doc.get("country"))
-        except Exception:
-            app_doc["country_flag"] = ""
-    return render_template("applications.html", apps=raw_data)
+    # Rows are fetched page by page from /api/applications by the page itself
+    return render_template("applications.html")
 
 # =========================
 # Application API
 # =========================
+# Shared pool for /apply I/O: Cloudinary uploads, IP geo lookup, admin notify
+APPLY_IO_WORKERS = int(os.getenv("APPLY_IO_WORKERS", "8"))
+apply_pool = ThreadPoolExecutor(max_workers=APPLY_IO_WORKERS, thread_name_prefix="apply")
+
+# Photo ingest: decode → strip EXIF → downscale → re-encode, on a process pool
+# so Pillow work doesn't hold the GIL of the request threads. Workers come
+# from a forkserver: forking this multi-threaded process could copy a lock
+# some other thread holds into the child.
+PHOTO_MAX_DIM = int(os.getenv("PHOTO_MAX_DIM", "1600"))
+PHOTO_FORMAT = os.getenv("PHOTO_FORMAT", "JPEG").upper()     # JPEG | WEBP
+PHOTO_QUALITY = int(os.getenv("PHOTO_QUALITY", "82"))
+PHOTO_THUMB_DIM = int(os.getenv("PHOTO_THUMB_DIM", "320"))   # 0 = no thumbnails
+photo_pool = ProcessPoolExecutor(max_workers=int(os.getenv("PHOTO_WORKERS", "2")),
+                                 mp_context=multiprocessing.get_context("forkserver"))
+
+def upload_photo(data: bytes) -> tuple[str, str | None]:
+    """Recompress one photo and upload it (plus thumbnail) → (url, thumb_url)."""
+    try:
+        photo, thumb = photo_pool.submit(
+            prepare_photo, data, PHOTO_MAX_DIM, PHOTO_FORMAT, PHOTO_QUALITY, PHOTO_THUMB_DIM
+        ).result()
+    except Exception as e:
+        print("Photo processing failed, uploading original:", e)
+        photo, thumb = data, None
+    upload_result = cloudinary.uploader.upload(io.BytesIO(photo), folder="cutestars_applications")
+    thumb_url = None
+    if thumb:
+        thumb_result = cloudinary.uploader.upload(io.BytesIO(thumb), folder="cutestars_applications/thumbs")
+        thumb_url = thumb_result["secure_url"]
+    return upload_result["secure_url"], thumb_url
+
+def lookup_ip_geo(ip_address: str) -> dict:
+    """ipapi.co lookup → {ip_country, ip_city, ip_region, ip_postal, ip_org} ({} on failure)."""
+    try:
+        res = requests.get(f"https://ipapi.co/{ip_address}/json/", timeout=10)
+        if res.status_code == 200:
+            data = res.json()
+            return {
+                "ip_country": data.get("country_name"),
+                "ip_city": data.get("city"),
+                "ip_region": data.get("region"),
+                "ip_postal": data.get("postal"),
+                "ip_org": data.get("org"),
+            }
+    except Exception as geo_err:
+        print("🌐 IP lookup failed:", geo_err)
+    return {}
+
+def _notify_new_application(applicant_data, uploaded_urls):
+    try:
+        send_application_to_telegram(applicant_data, uploaded_urls)
+    except Exception as e:
+        print("Telegram notify error:", e)
+
 @app.route("/apply", methods=["POST"])
 def apply():
     try:
@@ -401,23 +898,21 @@ def apply():
         ip_address = request.headers.get("CF-Connecting-IP") or \
                      request.headers.get("X-Forwarded-For", request.remote_addr).split(",")[0].strip()
 
-        try:
-            res = requests.get(f"https://ipapi.co/{ip_address}/json/", timeout=10)
-            if res.status_code == 200:
-                data = res.json()
-                geo.setdefault("ip", ip_address)
-                geo.setdefault("ip_country", data.get("country_name"))
-                geo.setdefault("ip_city", data.get("city"))
-                geo.setdefault("ip_region", data.get("region"))
-                geo["ip_postal"] = data.get("postal")
-                geo["ip_org"] = data.get("org")
-        except Exception as geo_err:
-            print("🌐 IP lookup failed:", geo_err)
-
-        uploaded_urls = []
-        for photo in photos:
-            upload_result = cloudinary.uploader.upload(photo, folder="cutestars_applications")
-            uploaded_urls.append(upload_result["secure_url"])
+        # Geo lookup and photo uploads run concurrently; the request waits
+        # roughly as long as the slowest single upload.
+        geo_future = apply_pool.submit(lookup_ip_geo, ip_address)
+        upload_futures = [apply_pool.submit(upload_photo, photo.read()) for photo in photos]
+        uploaded = [f.result() for f in upload_futures]
+        uploaded_urls = [url for url, _ in uploaded]
+        thumb_urls = [thumb or url for url, thumb in uploaded]
+
+        ip_geo = geo_future.result()
+        if ip_geo:
+            geo.setdefault("ip", ip_address)
+            for key in ("ip_country", "ip_city", "ip_region"):
+                geo.setdefault(key, ip_geo.get(key))
+            geo["ip_postal"] = ip_geo.get("ip_postal")
+            geo["ip_org"] = ip_geo.get("ip_org")
 
         applicant_data = {
             "name": name,
@@ -425,21 +920,19 @@ def apply():
             "email": email,
             "contact": contact,
             "country": country,
+            "country_flag": country_to_flag(country),
             "instagram": instagram,
             "tiktok": tiktok,
             "telegram": telegram,
             "photos": uploaded_urls,
+            "photo_thumbs": thumb_urls,
             **geo,
             "geo_latitude": latitude,
             "geo_longitude": longitude,
             "geo_accuracy": geo_accuracy,
         }
         applications_collection.insert_one(applicant_data)
-
-        try:
-            send_application_to_telegram(applicant_data, uploaded_urls)
-        except Exception as e:
-            print("Telegram notify error:", e)
+        apply_pool.submit(_notify_new_application, applicant_data, uploaded_urls)
 
         return jsonify({"message": "Application received successfully."}), 200
 
@@ -458,17 +951,132 @@ def delete_applications():
     result = applications_collection.delete_many({ "email": { "$in": emails } })
     return jsonify({ "deleted": result.deleted_count }), 200
 
+# Fields the admin table needs; everything else stays in Mongo
+APPLICATION_LIST_FIELDS = {
+    "name": 1, "age": 1, "email": 1, "contact": 1, "country": 1, "country_flag": 1, "status": 1,
+    "instagram": 1, "tiktok": 1, "telegram": 1, "telegram_id": 1,
+    "ip_city": 1, "ip_region": 1, "ip_country": 1,
+    "geo_latitude": 1, "geo_longitude": 1, "geo_accuracy": 1,
+    "photos": 1, "photo_thumbs": 1,
+}
+
+def _parse_day(value: str, end: bool = False) -> datetime:
+    """ISO date/datetime; a bare date used as an upper bound means end of that day."""
+    try:
+        dt = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Invalid date: {value}")
+    return dt + timedelta(days=1) if end and len(value) == 10 else dt
+
+def applications_query(args) -> dict:
+    """
+    Mongo filter from listing/export query args:
+    status, country, date_from, date_to (ISO, by ObjectId creation time),
+    has_telegram (true/false).
+    """
+    query: dict = {}
+    if args.get("status"):
+        query["status"] = args["status"]
+    if args.get("country"):
+        query["country"] = args["country"]
+    id_range = {}
+    if args.get("date_from"):
+        id_range["$gte"] = ObjectId.from_datetime(_parse_day(args["date_from"]))
+    if args.get("date_to"):
+        id_range["$lt"] = ObjectId.from_datetime(_parse_day(args["date_to"], end=True))
+    if id_range:
+        query["_id"] = id_range
+    has_tg = (args.get("has_telegram") or "").lower()
+    if has_tg in ("1", "true", "yes"):
+        query["telegram_id"] = {"$ne": None}
+    elif has_tg in ("0", "false", "no"):
+        query["telegram_id"] = None
+    return query
+
 @app.route("/api/applications", methods=["GET"])
 def api_applications():
     if "user" not in session:
         return jsonify({"error": "Unauthorized"}), 401
-    data = list(applications_collection.find({}, {"_id": 0}))
+    try:
+        query = applications_query(request.args)
+        limit = min(max(int(request.args.get("limit", 50)), 1), 200)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    direction = 1 if request.args.get("sort") == "asc" else -1
+
+    cursor_id = request.args.get("cursor")
+    if cursor_id:
+        if not ObjectId.is_valid(cursor_id):
+            return jsonify({"error": "Invalid cursor"}), 400
+        after = {"_id": {"$gt" if direction == 1 else "$lt": ObjectId(cursor_id)}}
+        query = {"$and": [query, after]} if query else after
+
+    data = list(
+        applications_collection.find(query, APPLICATION_LIST_FIELDS)
+        .sort("_id", direction)
+        .limit(limit + 1)
+    )
+    next_cursor = str(data[limit - 1]["_id"]) if len(data) > limit else None
+    data = data[:limit]
     for app_doc in data:
-        try:
+        app_doc["id"] = str(app_doc.pop("_id"))
+        if not app_doc.get("country_flag"):   # stored at insert since flags were persisted
             app_doc["country_flag"] = country_to_flag(app_doc.get("country"))
-        except Exception:
-            app_doc["country_flag"] = ""
-    return jsonify(data), 200
+    return jsonify({"items": data, "next_cursor": next_cursor}), 200
+
+EXPORT_FIELDS = [
+    "name", "age", "email", "contact", "country", "status", "instagram", "tiktok", "telegram",
+    "telegram_id", "application_id", "ip", "ip_city", "ip_region", "ip_country", "ip_org",
+    "geo_latitude", "geo_longitude", "geo_accuracy", "photos",
+]
+
+@app.route("/api/applications/export", methods=["GET"])
+def api_applications_export():
+    """Stream applications as CSV or NDJSON (same filters as the listing), batch by batch."""
+    if "user" not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+    fmt = request.args.get("format", "csv").lower()
+    if fmt not in ("csv", "ndjson"):
+        return jsonify({"error": "format must be csv or ndjson"}), 400
+    try:
+        query = applications_query(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    projection = {f: 1 for f in EXPORT_FIELDS}
+    cursor = applications_collection.find(query, projection).sort("_id", 1).batch_size(500)
+
+    def rows():
+        for doc in cursor:
+            doc["created_at"] = doc.pop("_id").generation_time.isoformat()
+            yield doc
+
+    def generate_csv():
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        writer.writerow(["created_at", *EXPORT_FIELDS])
+        yield buf.getvalue()
+        for doc in rows():
+            buf.seek(0)
+            buf.truncate()
+            writer.writerow([doc["created_at"]] + [
+                " ".join(v) if isinstance(v, list) else ("" if v is None else v)
+                for v in (doc.get(f) for f in EXPORT_FIELDS)
+            ])
+            yield buf.getvalue()
+
+    def generate_ndjson():
+        for doc in rows():
+            yield json.dumps(doc, ensure_ascii=False, default=str) + "\n"
+
+    stamp = datetime.utcnow().strftime("%Y%m%d")
+    mimetype = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    body = generate_csv() if fmt == "csv" else generate_ndjson()
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename=applications-{stamp}.{fmt}"},
+    )
 
 # =========================
 # Users / Admin CRUD
@@ -535,26 +1143,14 @@ def send_to_admin():
             f"🌐 *Region:* {app_doc.get('ip_region', '—')}\n"
             f"🏳️ *Country:* {app_doc.get('ip_country', '—')}"
         )
-        try:
-            requests.post(
-                f"https://api.telegram.org/bot{os.getenv('TELEGRAM_BOT_TOKEN')}/sendMessage",
-                json={"chat_id": tg_id, "text": message, "parse_mode": "Markdown"}
-            )
-        except Exception as e:
-            print("❌ Telegram message failed:", e)
+        tg_send_message(tg_id, message, parse_mode="Markdown", priority=PRIORITY_BULK)
 
         photo_urls = app_doc.get("photos", [])
         if photo_urls:
-            media_group = [{"type": "photo", "media": url} for url in photo_urls[:10]]
-            try:
-                requests.post(
-                    f"https://api.telegram.org/bot{os.getenv('TELEGRAM_BOT_TOKEN')}/sendMediaGroup",
-                    json={"chat_id": tg_id, "media": media_group}
-                )
-            except Exception as e:
-                print("❌ Telegram sendMediaGroup failed:", e)
+            telegram_queue.send_media_group(tg_id, photo_urls)
 
-    return jsonify({"status": "ok"})
+    # Delivery is asynchronous and rate-limited; see /debug/telegram-queue
+    return jsonify({"status": "ok", "queued": len(apps)})
 
 @app.route("/api/users", methods=["GET"])
 def get_users():
@@ -606,9 +1202,112 @@ def create_admin_user():
     })
     return "✅ Admin created"
 
+# =========================
+# Background ingestion jobs
+# =========================
+# Uploads return a job id at once; extract → chunk → embed → write runs on
+# `ingest_pool` and reports progress at /knowledge/jobs/<id>. The worker
+# running a job keeps it in INGEST_JOBS and writes it through to
+# `ingest_jobs_coll` (stage changes at once, progress counters at most every
+# INGEST_JOB_SAVE_SECONDS), so whichever worker a poll lands on can answer.
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+INGEST_JOB_SAVE_SECONDS = float(os.getenv("INGEST_JOB_SAVE_SECONDS", "1"))
+INGEST_JOB_TTL_HOURS = float(os.getenv("INGEST_JOB_TTL_HOURS", "24"))
+ingest_pool = ThreadPoolExecutor(max_workers=INGEST_WORKERS, thread_name_prefix="ingest")
+INGEST_JOBS: dict[str, dict] = {}
+_jobs_lock = threading.Lock()
+_job_save_lock = threading.Lock()         # keeps a slow older snapshot from landing after a newer one
+_job_saved_at: dict[str, float] = {}
+MAX_FINISHED_JOBS = 100
+
+def _save_job(job: dict, force: bool = True):
+    now = time.monotonic()
+    with _job_save_lock:
+        with _jobs_lock:
+            if not force and now - _job_saved_at.get(job["id"], 0) < INGEST_JOB_SAVE_SECONDS:
+                return
+            _job_saved_at[job["id"]] = now
+            doc = dict(job)
+        doc["_id"] = doc.pop("id")
+        doc["expires_at"] = datetime.utcnow() + timedelta(hours=INGEST_JOB_TTL_HOURS)
+        try:
+            ingest_jobs_coll.replace_one({"_id": doc["_id"]}, doc, upsert=True)
+        except Exception as e:
+            print(f"Ingest job {doc['_id']} save failed:", e)
+
+def _job_update(job: dict, **fields):
+    with _jobs_lock:
+        job.update(fields)
+    _save_job(job)
+
+def _job_incr(job: dict, key: str, n: int = 1):
+    with _jobs_lock:
+        job[key] = job.get(key, 0) + n
+    _save_job(job, force=False)
+
+def _counting(items: Iterable, job: dict, key: str) -> Iterator:
+    """Pass `items` through, counting them into job[key]."""
+    for item in items:
+        _job_incr(job, key)
+        yield item
+
+def start_ingest_job(*, name: str, kind: str, size: int, work) -> dict:
+    """Queue `work(job) -> chunks` on the ingest pool; returns the job record."""
+    job = {
+        "id": uuid.uuid4().hex, "name": name, "kind": kind, "size": size,
+        "stage": "queued", "pages": 0, "chunks": 0, "embedded": 0,
+        "error": None, "created_at": time.time(), "started_at": None, "finished_at": None,
+    }
+    with _jobs_lock:
+        finished = [j for j in INGEST_JOBS.values() if j["finished_at"]]
+        for old in sorted(finished, key=lambda j: j["finished_at"])[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            INGEST_JOBS.pop(old["id"], None)
+            _job_saved_at.pop(old["id"], None)
+        INGEST_JOBS[job["id"]] = job
+    _save_job(job)
+
+    def run():
+        _job_update(job, stage="extracting", started_at=time.time())
+        try:
+            chunks = work(job)
+            _job_update(job, stage="done", chunks=chunks, finished_at=time.time())
+        except Exception as e:
+            print(f"Ingest job {job['id']} failed:", e)
+            _job_update(job, stage="error", error=str(e), finished_at=time.time())
+
+    ingest_pool.submit(run)
+    return job
+
+def job_status(job: dict) -> dict:
+    with _jobs_lock:
+        out = dict(job)
+    if out["started_at"]:
+        elapsed = (out["finished_at"] or time.time()) - out["started_at"]
+        out["elapsed_s"] = round(elapsed, 2)
+        out["chunks_per_s"] = round(out["embedded"] / elapsed, 2) if elapsed > 0 else 0.0
+    return out
+
+@app.route("/knowledge/jobs/<job_id>", methods=["GET"])
+def knowledge_job(job_id):
+    job = INGEST_JOBS.get(job_id)
+    if not job:
+        # queued or run by another worker process
+        job = ingest_jobs_coll.find_one({"_id": job_id}, {"expires_at": 0})
+        if not job:
+            return jsonify({"error": "Not found"}), 404
+        job["id"] = job.pop("_id")
+    return jsonify(job_status(job))
+
 # =========================
 # Knowledge upload (admin PDF legacy button)
 # =========================
+# Page ranges of large PDFs are parsed in parallel processes and streamed
+# into the chunker/embedder in page order. Like photo_pool, workers start
+# from a forkserver rather than a fork of this threaded process; they
+# re-import this module, which starts nothing until start_background_services().
+pdf_pool = ProcessPoolExecutor(max_workers=int(os.getenv("PDF_WORKERS", "2")),
+                               mp_context=multiprocessing.get_context("forkserver"))
+
 @app.route("/admin/upload-pdf", methods=["POST"])
 def admin_upload_pdf():
     if "user" not in session:
@@ -620,56 +1319,182 @@ def admin_upload_pdf():
     f = request.files["file"]
     data = f.read()
 
-    # Index via the unified indexer
-    try:
-        doc_id = f"adminpdf-{uuid.uuid4()}"
-        combined = ""
-        reader = PdfReader(io.BytesIO(data))
-        for page in reader.pages:
-            combined += (page.extract_text() or "") + "\n"
-        chunks = index_into_vector_store(doc_id=doc_id, name=f.filename, kind="pdf", text=combined)
-        # store meta for table
-        DOCS[doc_id] = {
-            "id": doc_id, "name": f.filename, "kind": "pdf",
-            "size": len(data), "chunks": chunks, "created_at": time.time()
-        }
-        return jsonify({"status": "ok", "chunks": chunks, "lang": lang})
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    # Index via the knowledge store, in the background
+    name = f.filename
+    doc_id = knowledge_doc_id(name, "pdf")
+
+    def work(job):
+        pages = _counting(iter_pdf_pages(data, pool=pdf_pool), job, "pages")
+        return index_into_vector_store(doc_id=doc_id, name=name, kind="pdf", text=pages,
+                                       size=len(data), job=job)
+
+    job = start_ingest_job(name=name, kind="pdf", size=len(data), work=work)
+    return jsonify({"status": "queued", "job_id": job["id"], "lang": lang}), 202
 
 # =========================
 # Telegram Webhook (RAG + multilingual flow)
 # =========================
 
 # --- RAG helpers for the bot (language-agnostic storage) ---
-def _embed(text: str) -> np.ndarray:
-    v = openai_client.embeddings.create(
-        model="text-embedding-3-small",
-        input=text
-    ).data[0].embedding
-    return np.array(v, dtype=np.float32)
-
-def retrieve_context(query: str, k: int = 6) -> str:
-    """Cosine-sim search over Mongo 'knowledge' chunks → joined context string."""
-    qv = _embed(query)
-    scored = []
-    # Limit to a manageable batch; adjust as needed
-    for row in knowledge_collection.find({}, {"_id": 0, "text": 1, "embedding": 1}).limit(2000):
-        ev = np.array(row.get("embedding") or [], dtype=np.float32)
-        if ev.size == 0:
-            continue
-        sim = float(np.dot(qv, ev) / (np.linalg.norm(qv) * np.linalg.norm(ev) + 1e-9))
-        scored.append((sim, row["text"]))
-    scored.sort(key=lambda x: x[0], reverse=True)
-    return "\n\n".join([t for _, t in scored[:k]])
+# Prompt context is packed, not just top-k joined: weak hits are dropped,
+# near-duplicates removed (MMR) and the rest fitted into a token budget.
+RAG_CANDIDATES = int(os.getenv("RAG_CANDIDATES", "12"))
+RAG_MAX_CHUNKS = int(os.getenv("RAG_MAX_CHUNKS", "6"))
+RAG_CONTEXT_TOKENS = int(os.getenv("RAG_CONTEXT_TOKENS", "1500"))
+RAG_INTRO_CONTEXT_TOKENS = int(os.getenv("RAG_INTRO_CONTEXT_TOKENS", "2000"))
+RAG_MIN_SCORE = float(os.getenv("RAG_MIN_SCORE", "0.25"))
+RAG_MMR_LAMBDA = float(os.getenv("RAG_MMR_LAMBDA", "0.7"))
+rag_stats = PackStats()
+
+def retrieve_context(query: str, budget_tokens: int = RAG_CONTEXT_TOKENS, query_vec=None) -> str:
+    """Hybrid-search the knowledge base and pack the hits into ≤ budget_tokens of context."""
+    hits = hybrid_search(query, k=RAG_CANDIDATES, query_vec=query_vec, min_score=RAG_MIN_SCORE)
+    context, info = pack_context(
+        hits, token_counter, budget_tokens=budget_tokens, min_score=RAG_MIN_SCORE,
+        mmr_lambda=RAG_MMR_LAMBDA, max_chunks=RAG_MAX_CHUNKS,
+    )
+    rag_stats.record(info)
+    print(f"RAG context: {info['chunks']}/{info['candidates']} chunks, {info['tokens']} tokens "
+          f"(dropped {info['below_threshold']} weak, {info['duplicates']} dup, {info['over_budget']} over budget)")
+    return context
+
+# Everything derived from the knowledge base is cached until it changes:
+# the intro context (constant query) and the generated intro per language.
+INTRO_QUERY = "overview role pay onboarding policies"
+_knowledge_generation = 0
+_intro_cache: dict[str, str] = {}                 # "__context__" / language → text
+_intro_locks: dict[str, threading.Lock] = defaultdict(threading.Lock)
+
+def _on_knowledge_changed():
+    """Invalidate knowledge-derived caches; call after any knowledge_collection write."""
+    global _knowledge_generation
+    _knowledge_generation += 1
+    _intro_cache.clear()
+    answer_cache.clear()
+    # Re-precompute the intro context off the request path
+    threading.Thread(target=_warm_intro_context, daemon=True).start()
+
+def _warm_intro_context():
+    try:
+        build_context_for_intro()
+    except Exception as e:
+        print("Intro context warm-up failed:", e)
 
 def build_context_for_intro() -> str:
     # broad warm-up query; storage can be in any language
-    return retrieve_context("overview role pay onboarding policies", k=6)
+    ctx = _intro_cache.get("__context__")
+    if ctx is None:
+        gen = _knowledge_generation
+        ctx = retrieve_context(INTRO_QUERY, budget_tokens=RAG_INTRO_CONTEXT_TOKENS)
+        if gen == _knowledge_generation:
+            _intro_cache["__context__"] = ctx
+    return ctx
+
+# Bot replies are streamed into Telegram (send, then throttled edits) so the
+# applicant sees text within a second instead of after the full completion.
+STREAM_REPLIES = os.getenv("STREAM_REPLIES", "1") == "1"
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "1.2"))
+
+def chat_completion(messages: list[dict], temperature: float, on_delta=None) -> str:
+    """gpt-4o completion; with `on_delta`, streamed and fed to it fragment by fragment."""
+    if on_delta is None:
+        resp = openai_client.chat.completions.create(model="gpt-4o", messages=messages, temperature=temperature)
+        return resp.choices[0].message.content
+    parts = []
+    stream = openai_client.chat.completions.create(
+        model="gpt-4o", messages=messages, temperature=temperature, stream=True,
+    )
+    for chunk in stream:
+        delta = chunk.choices[0].delta.content if chunk.choices else None
+        if delta:
+            parts.append(delta)
+            on_delta(delta)
+    return "".join(parts)
+
+def reply_stream(chat_id):
+    """A TelegramStreamWriter for `chat_id`, or None when streaming is off."""
+    if not STREAM_REPLIES:
+        return None
+    return TelegramStreamWriter(telegram_queue, chat_id, min_interval=STREAM_EDIT_INTERVAL)
+
+def generate_intro(lang: str, on_delta=None) -> str:
+    """
+    GPT job intro for `lang`; generated once per language per knowledge
+    version. `on_delta` receives the text as it streams (cache misses only).
+    """
+    refresh_knowledge()
+    cached = _intro_cache.get(lang)
+    if cached:
+        return cached
+    with _intro_locks[lang]:      # one completion per language even during onboarding bursts
+        cached = _intro_cache.get(lang)
+        if cached:
+            return cached
+        gen = _knowledge_generation
+        context = build_context_for_intro()
+        prompt_user = (
+            f"Speak in {lang}. Using ONLY the provided context, briefly explain the job, "
+            f"benefits, pay cadence, and requirements in 120–180 words. Invite the applicant to ask questions.\n\n"
+            f"=== CONTEXT START ===\n{context}\n=== CONTEXT END ==="
+        )
+        intro_text = chat_completion(
+            [
+                {"role": "system",
+                 "content": "You are a recruiter. Answer strictly from context."},
+                {"role": "user", "content": prompt_user},
+            ],
+            temperature=0.4,
+            on_delta=on_delta,
+        )
+        if intro_text and gen == _knowledge_generation:
+            _intro_cache[lang] = intro_text
+        return intro_text
+
+def build_context_for_question(question: str, query_vec=None) -> str:
+    return retrieve_context(question, query_vec=query_vec)
+
+# Applicants ask the same few questions in many phrasings; answers are
+# reused per language when a new question embeds close to a cached one.
+answer_cache = SemanticAnswerCache(
+    threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.92")),
+    ttl=float(os.getenv("ANSWER_CACHE_TTL", "86400")),
+    max_items=int(os.getenv("ANSWER_CACHE_MAX", "500")),
+)
+
+def answer_question(lang: str, question: str, on_delta=None) -> str:
+    """
+    RAG answer to an applicant question, served from answer_cache when a
+    close match exists; otherwise generated, streaming into `on_delta`.
+    """
+    refresh_knowledge()
+    gen = _knowledge_generation
+    qvec = embed_query(question)
+    cached = answer_cache.lookup(lang, qvec) if qvec is not None else None
+    if cached:
+        return cached[0]
+    context = build_context_for_question(question, query_vec=qvec)
+    qna_prompt = (
+        f"Use the context to answer in {lang}, friendly and concise.\n"
+        f"Question: {question}\n\n"
+        f"=== CONTEXT START ===\n{context}\n=== CONTEXT END ==="
+    )
+    answer = chat_completion(
+        [
+            {"role": "system", "content": "Answer clearly using the provided context only."},
+            {"role": "user", "content": qna_prompt},
+        ],
+        temperature=0.5,
+        on_delta=on_delta,
+    )
+    if answer and qvec is not None and gen == _knowledge_generation:
+        answer_cache.store(lang, question, qvec, answer)
+    return answer
 
-def build_context_for_question(question: str) -> str:
-    return retrieve_context(question, k=6)
 
+# Updates are handled off the request thread; routing by chat_id keeps each
+# chat's messages in order while different chats run in parallel.
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "4"))
+webhook_pool = KeyedWorkerPool(WEBHOOK_WORKERS, name="webhook")
 
 @app.route("/webhook", methods=["POST"])
 def telegram_webhook():
@@ -696,13 +1521,31 @@ def telegram_webhook():
             print("Webhook disabled by settings.")
             return "ok", 200
 
-        return handle_webhook_logic(chat_id, text, msg)
+        webhook_pool.submit(chat_id, handle_webhook_update, chat_id, text, msg)
+        return "ok", 200
 
     except Exception as e:
         print("WEBHOOK CRASH:", e)
         traceback.print_exc()
         return "ok", 200
 
+def handle_webhook_update(chat_id, text, msg):
+    # With SESSION_CACHE_MODE=cas another process may have moved this chat's
+    # session on since we read it. Every branch of handle_webhook_logic
+    # claims its transition (set_state) before sending or writing anything,
+    # so a SessionConflict means nothing has happened yet and the update can
+    # be dispatched again on the fresh state without duplicating messages.
+    for attempt in range(3):
+        try:
+            return handle_webhook_logic(chat_id, text, msg)
+        except SessionConflict as e:
+            print(f"⚠️ Session conflict (attempt {attempt + 1}):", e)
+    print(f"❌ Gave up on update for chat {chat_id} after repeated session conflicts")
+
+@app.route("/webhook/metrics", methods=["GET"])
+def webhook_metrics():
+    return jsonify(webhook_pool.metrics())
+
 
 def handle_webhook_logic(chat_id, text, msg):
     LANGUAGES = ["English", "Spanish", "Portuguese", "Russian", "Serbian"]
@@ -853,35 +1696,26 @@ def handle_webhook_logic(chat_id, text, msg):
             tg_send_message(chat_id, t(lang, "email_not_found"))
             return "ok", 200
 
+        # claim the transition first: a slow or failed reply must not leave
+        # the chat stuck in awaiting_email
+        set_state(chat_id, state="job_intro", email=email)
         applications_collection.update_one(
             {"_id": applicant["_id"]},
             {"$set": {"telegram_id": chat_id, "language": lang}},
         )
 
+        stream = reply_stream(chat_id)
         try:
-            context = build_context_for_intro()
-            prompt_user = (
-                f"Speak in {lang}. Using ONLY the provided context, briefly explain the job, "
-                f"benefits, pay cadence, and requirements in 120–180 words. Invite the applicant to ask questions.\n\n"
-                f"=== CONTEXT START ===\n{context}\n=== CONTEXT END ==="
-            )
-            gpt_response = openai_client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system",
-                     "content": "You are a recruiter. Answer strictly from context."},
-                    {"role": "user", "content": prompt_user},
-                ],
-                temperature=0.4,
-            )
-            intro_text = gpt_response.choices[0].message.content
+            intro_text = generate_intro(lang, on_delta=stream.feed if stream else None)
         except Exception as e:
             print("OpenAI intro error:", e)
-            intro_text = t(lang, "generic_intro_fallback")
+            intro_text = (stream and stream.text) or t(lang, "generic_intro_fallback")
 
-        tg_send_message(chat_id, intro_text)
+        if stream:
+            stream.finish(intro_text)
+        else:
+            tg_send_message(chat_id, intro_text)
         tg_send_message(chat_id, t(lang, "prompt_confirm_or_ask"), reply_markup=kb_confirm(lang))
-        set_state(chat_id, state="job_intro", email=email)
         return "ok", 200
 
     # Q&A stage
@@ -891,27 +1725,17 @@ def handle_webhook_logic(chat_id, text, msg):
             tg_send_message(chat_id, t(lang, "ask_platform"), reply_markup=kb_platform(lang))
             return "ok", 200
 
+        stream = reply_stream(chat_id)
         try:
-            context = build_context_for_question(text)
-            qna_prompt = (
-                f"Use the context to answer in {lang}, friendly and concise.\n"
-                f"Question: {text}\n\n"
-                f"=== CONTEXT START ===\n{context}\n=== CONTEXT END ==="
-            )
-            gpt_answer = openai_client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": "Answer clearly using the provided context only."},
-                    {"role": "user", "content": qna_prompt},
-                ],
-                temperature=0.5,
-            )
-            answer = gpt_answer.choices[0].message.content
+            answer = answer_question(lang, text, on_delta=stream.feed if stream else None)
         except Exception as e:
             print("OpenAI Q&A error:", e)
-            answer = t(lang, "prompt_confirm_or_ask")
+            answer = (stream and stream.text) or t(lang, "prompt_confirm_or_ask")
 
-        tg_send_message(chat_id, answer, parse_mode="Markdown")
+        if stream:
+            stream.finish(answer, parse_mode="Markdown")
+        else:
+            tg_send_message(chat_id, answer, parse_mode="Markdown")
         tg_send_message(chat_id, t(lang, "prompt_confirm_or_ask"), reply_markup=kb_confirm(lang))
         return "ok", 200
 
@@ -924,24 +1748,24 @@ def handle_webhook_logic(chat_id, text, msg):
             tg_send_message(chat_id, t(lang, "choose_android_or_ios"), reply_markup=kb_platform(lang))
             return "ok", 200
 
+        set_state(chat_id, state="awaiting_app_id")
         link = APP_URL_ANDROID if is_android else APP_URL_IOS
         tg_send_message(chat_id, t(lang, "download_link").format(link=link))
         tg_send_message(chat_id, t(lang, "signup_video").format(video=SIGNUP_VIDEO))
         tg_send_message(chat_id, t(lang, "ask_app_id"), parse_mode="Markdown")
-        set_state(chat_id, state="awaiting_app_id")
         return "ok", 200
 
     # Receive App ID
     if state == "awaiting_app_id":
         app_id = text.strip()
         email = st.get("email")
+        set_state(chat_id, state="waiting_approval")
         if email:
             applications_collection.update_one(
                 {"email": email},
                 {"$set": {"application_id": app_id}},
             )
         tg_send_message(chat_id, t(lang, "thanks_wait"))
-        set_state(chat_id, state="waiting_approval")
 
         try:
             if ADMIN_CHAT_ID:
@@ -957,15 +1781,10 @@ def handle_webhook_logic(chat_id, text, msg):
                         f"• Telegram ID: {chat_id}\n"
                         f"Reply:  *activated {app_doc.get('email')}*"
                     )
-                    tg_send_message(ADMIN_CHAT_ID, summary, parse_mode="Markdown")
+                    tg_send_message(ADMIN_CHAT_ID, summary, parse_mode="Markdown", priority=PRIORITY_BULK)
                     photos = (app_doc.get("photos") or [])[:10]
                     if photos:
-                        media_group = [{"type": "photo", "media": u} for u in photos]
-                        requests.post(
-                            f"https://api.telegram.org/bot{os.getenv('TELEGRAM_BOT_TOKEN')}/sendMediaGroup",
-                            json={"chat_id": ADMIN_CHAT_ID, "media": media_group},
-                            timeout=20,
-                        )
+                        telegram_queue.send_media_group(ADMIN_CHAT_ID, photos)
         except Exception as e:
             print("Admin notify error:", e)
 
@@ -1023,6 +1842,30 @@ def debug_openai_ping():
     except Exception as e:
         # show why it failed (bad key, missing credits, model access, etc.)
         return jsonify({"status": "error", "error": str(e)}), 500
+@app.route("/debug/session-cache")
+def debug_session_cache():
+    return jsonify(session_cache.stats())
+
+@app.route("/debug/indexes")
+def debug_indexes():
+    return jsonify({"indexes": index_report})
+
+@app.route("/debug/telegram-queue")
+def debug_telegram_queue():
+    return jsonify(telegram_queue.stats())
+
+@app.route("/debug/embedding-cache")
+def debug_embedding_cache():
+    return jsonify(embedding_cache.stats())
+
+@app.route("/debug/rag-context")
+def debug_rag_context():
+    return jsonify(rag_stats.stats())
+
+@app.route("/debug/answer-cache")
+def debug_answer_cache():
+    return jsonify(answer_cache.stats())
+
 # =========================
 # Knowledge upload/list/delete/search (JSON, JSONL, PDF)
 # =========================
@@ -1032,7 +1875,6 @@ def knowledge_health():
 
 @app.route("/knowledge/upload", methods=["POST"])
 def upload_knowledge():
-    global vector_store
     try:
         file = request.files.get("file")
         if not file:
@@ -1040,75 +1882,79 @@ def upload_knowledge():
 
         filename = file.filename
         ext = os.path.splitext(filename)[1].lower()
-        save_path = os.path.join(UPLOAD_FOLDER, filename)
-        file.save(save_path)
-
-        text_chunks = []
-
-        # ===== PDF =====
-        if ext == ".pdf":
-            reader = PdfReader(save_path)
-            for page in reader.pages:
-                text = page.extract_text()
-                if text:
-                    text_chunks.append(text.strip())
-
-        # ===== JSON =====
-        elif ext == ".json":
-            with open(save_path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            if isinstance(data, list):
-                for entry in data:
-                    text_chunks.append(json.dumps(entry, ensure_ascii=False))
-            elif isinstance(data, dict):
-                text_chunks.append(json.dumps(data, ensure_ascii=False))
-
-        # ===== JSONL =====
-        elif ext == ".jsonl":
-            with open(save_path, "r", encoding="utf-8") as f:
-                for line in f:
-                    if line.strip():
-                        try:
-                            obj = json.loads(line.strip())
-                            text_chunks.append(json.dumps(obj, ensure_ascii=False))
-                        except json.JSONDecodeError:
-                            continue
-
-        else:
+        if ext not in (".pdf", ".json", ".jsonl"):
             return jsonify({"error": f"Unsupported file type: {ext}"}), 400
 
-        # Convert chunks to LangChain Document objects
-        docs = [Document(page_content=chunk) for chunk in text_chunks]
-
-        # Create or update FAISS vector store
-        if vector_store is None:
-            vector_store = FAISS.from_documents(docs, embeddings)
-        else:
-            vector_store.add_documents(docs)
+        # private per-job copy: a re-upload of the same name can't overwrite it mid-job
+        fd, save_path = tempfile.mkstemp(suffix=ext, dir=UPLOAD_FOLDER)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                file.save(f)
+            kind = ext[1:]
+            size = os.path.getsize(save_path)
+            doc_id = knowledge_doc_id(filename, kind)
+        except Exception:
+            os.unlink(save_path)
+            raise
+
+        def pieces(job):
+            # ===== PDF =====
+            if ext == ".pdf":
+                yield from _counting(iter_pdf_pages(save_path, pool=pdf_pool), job, "pages")
+
+            # ===== JSON =====  (one piece per record, so records stay whole in chunks)
+            elif ext == ".json":
+                with open(save_path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                for entry in (data if isinstance(data, list) else [data]):
+                    yield json.dumps(entry, ensure_ascii=False)
+
+            # ===== JSONL =====
+            elif ext == ".jsonl":
+                with open(save_path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        if line.strip():
+                            try:
+                                obj = json.loads(line.strip())
+                                yield json.dumps(obj, ensure_ascii=False)
+                            except json.JSONDecodeError:
+                                continue
+
+        def work(job):
+            try:
+                return index_into_vector_store(doc_id=doc_id, name=filename, kind=kind, text=pieces(job),
+                                               size=size, job=job)
+            finally:
+                os.unlink(save_path)
 
+        try:
+            job = start_ingest_job(name=filename, kind=kind, size=size, work=work)
+        except Exception:
+            os.unlink(save_path)
+            raise
         return jsonify({
             "ok": True,
+            "job_id": job["id"],
             "doc": {
+                "id": doc_id,
                 "name": filename,
-                "kind": ext[1:],
-                "size": os.path.getsize(save_path),
-                "chunks": len(text_chunks)
+                "kind": kind,
+                "size": size,
             }
-        })
+        }), 202
 
     except Exception as e:
         return jsonify({"error": f"Unexpected error: {str(e)}"}), 500
 
 @app.route("/knowledge", methods=["GET"])
 def knowledge_list():
-    return jsonify({"docs": list(DOCS.values())})
+    docs = [{"id": d.pop("_id"), **d} for d in knowledge_docs_coll.find({}).sort("created_at", -1)]
+    return jsonify({"docs": docs})
 
 @app.route("/knowledge/<doc_id>", methods=["DELETE"])
 def knowledge_delete(doc_id):
-    if doc_id not in DOCS:
+    if not delete_knowledge_doc(doc_id):
         return jsonify({"error": "Not found"}), 404
-    knowledge_collection.delete_many({"doc_id": doc_id})
-    del DOCS[doc_id]
     return jsonify({"ok": True})
 
 @app.route("/knowledge/search", methods=["GET"])
@@ -1116,20 +1962,32 @@ def knowledge_search():
     q = request.args.get("q", "").strip()
     if not q:
         return jsonify({"error": "q required"}), 400
-    qv = np.array(get_embedding(q))
-    items = list(knowledge_collection.find({}, {"_id": 0, "text": 1, "embedding": 1, "name": 1, "doc_id": 1}).limit(500))
-    scored = []
-    for it in items:
-        v = np.array(it["embedding"])
-        sim = float(np.dot(qv, v) / (np.linalg.norm(qv) * np.linalg.norm(v) + 1e-9))
-        scored.append((sim, it))
-    scored.sort(key=lambda x: x[0], reverse=True)
-    top = [{"score": round(s, 4), "name": it["name"], "doc_id": it["doc_id"], "text": it["text"][:300]} for s, it in scored[:5]]
+    top = [{"score": round(d["score"], 4), "name": d["name"], "doc_id": d["doc_id"], "text": d["text"][:300]}
+           for d in search_knowledge(q, k=5)]
     return jsonify({"results": top})
 
 # =========================
 # Main
 # =========================
+_services_started = False
+
+def start_background_services():
+    """
+    Start what runs beside the request handlers: the Mongo index bootstrap,
+    the Telegram send queue (sender threads + outbox restore) and the
+    knowledge_docs backfill. Called from the entry point only, never at
+    import: photo/PDF pool workers re-import this module as `__mp_main__`
+    and must not get their own senders or replay the outbox.
+    """
+    global _services_started
+    if _services_started:
+        return
+    _services_started = True
+    threading.Thread(target=bootstrap_indexes, name="mongo-indexes", daemon=True).start()
+    telegram_queue.start()
+    threading.Thread(target=backfill_knowledge_docs, name="knowledge-docs", daemon=True).start()
+
 if __name__ == "__main__":
+    start_background_services()
     print("✅ Flask server ready on port", PORT)
     app.run(host="0.0.0.0", port=PORT)
@@ -0,0 +1,90 @@
+import threading
+import time
+
+import numpy as np
+
+from utils.vector_index import normalize
+
+
+class SemanticAnswerCache:
+    """
+    In-memory cache of generated answers keyed by (language, question
+    embedding). A lookup returns the stored answer of the most similar
+    cached question if cosine similarity >= `threshold`, so paraphrases
+    ("how much is the pay?" / "what's the salary?") share one completion.
+
+    Entries expire after `ttl` seconds; each language keeps at most
+    `max_items` (oldest evicted first). Call `clear()` whenever the
+    knowledge base changes, since answers are derived from it.
+    """
+
+    def __init__(self, threshold: float = 0.92, ttl: float = 86400, max_items: int = 500):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_items = max_items
+        self._lock = threading.Lock()
+        self._entries: dict[str, list[tuple[float, str, str]]] = {}   # lang → [(expires_at, question, answer)]
+        self._vectors: dict[str, np.ndarray] = {}                      # lang → (n, dim) unit rows
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.clears = 0
+
+    def _expire(self, lang: str, now: float):
+        entries = self._entries.get(lang)
+        if not entries:
+            return
+        keep = [i for i, e in enumerate(entries) if e[0] > now]
+        if len(keep) != len(entries):
+            self._entries[lang] = [entries[i] for i in keep]
+            self._vectors[lang] = self._vectors[lang][keep]
+
+    def lookup(self, lang: str, vector) -> tuple[str, float] | None:
+        """(answer, similarity) of the closest cached question, or None."""
+        q = normalize(vector)
+        with self._lock:
+            self._expire(lang, time.monotonic())
+            mat = self._vectors.get(lang)
+            if mat is not None and len(mat) and mat.shape[1] == len(q):
+                sims = mat @ q
+                best = int(np.argmax(sims))
+                if sims[best] >= self.threshold:
+                    self.hits += 1
+                    return self._entries[lang][best][2], float(sims[best])
+            self.misses += 1
+            return None
+
+    def store(self, lang: str, question: str, vector, answer: str):
+        q = normalize(vector)
+        with self._lock:
+            now = time.monotonic()
+            self._expire(lang, now)
+            entries = self._entries.setdefault(lang, [])
+            mat = self._vectors.get(lang)
+            if mat is None or mat.shape[1] != len(q):
+                entries.clear()
+                mat = np.zeros((0, len(q)), dtype=np.float32)
+            entries.append((now + self.ttl, question, answer))
+            mat = np.vstack([mat, q[None, :]])
+            if len(entries) > self.max_items:
+                drop = len(entries) - self.max_items
+                del entries[:drop]
+                mat = mat[drop:]
+            self._vectors[lang] = mat
+            self.stores += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._vectors.clear()
+            self.clears += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "items": {lang: len(e) for lang, e in self._entries.items()},
+                "hits": self.hits, "misses": self.misses, "stores": self.stores, "clears": self.clears,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+                "threshold": self.threshold, "ttl": self.ttl,
+            }
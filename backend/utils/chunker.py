@@ -0,0 +1,181 @@
+import re
+from collections import deque
+from typing import Iterable, Iterator
+
+_WS = re.compile(r"[ \t\r\f\v]+")
+_BLANK = re.compile(r"\n\s*\n")
+_SENTENCE_END = re.compile(r"(?<=[.!?…])\s+")
+_HEADING_MAX_CHARS = 80
+
+
+def normalize_ws(s: str) -> str:
+    return re.sub(r"\s+", " ", (s or "")).strip()
+
+
+class TokenCounter:
+    """
+    tiktoken-backed token counter/slicer. Falls back to ≈4 chars/token if
+    the encoding cannot be loaded (e.g. no network to fetch the BPE file).
+    """
+
+    def __init__(self, encoding: str = "cl100k_base"):
+        try:
+            import tiktoken
+            self._enc = tiktoken.get_encoding(encoding)
+        except Exception as e:
+            print(f"⚠️ tiktoken encoding {encoding!r} unavailable, approximating tokens:", e)
+            self._enc = None
+
+    def count(self, text: str) -> int:
+        if self._enc is None:
+            return max(1, len(text) // 4)
+        return len(self._enc.encode(text, disallowed_special=()))
+
+    def split(self, text: str, max_tokens: int) -> list[str]:
+        """Hard-split `text` into pieces of at most `max_tokens` tokens."""
+        if self._enc is None:
+            step = max_tokens * 4
+            return [text[i:i + step] for i in range(0, len(text), step)]
+        ids = self._enc.encode(text, disallowed_special=())
+        return [self._enc.decode(ids[i:i + max_tokens]) for i in range(0, len(ids), max_tokens)]
+
+
+def _is_heading(line: str) -> bool:
+    return (0 < len(line) <= _HEADING_MAX_CHARS and line[-1] not in ".!?,;:…"
+            and not line.startswith(("{", "[", "-", "•", "*")))
+
+
+def _unwrap(lines: list[str]) -> str:
+    """Join hard-wrapped lines (PDF text) into one paragraph; "exam-\nple" keeps its hyphen but no space."""
+    out = ""
+    for line in lines:
+        out += line if not out or out.endswith("-") else " " + line
+    return normalize_ws(out)
+
+
+def _blocks(text: str) -> Iterator[tuple[str, str]]:
+    """
+    Yield (kind, text) structural blocks of one input piece:
+    "record" (a whole JSON object/array), "heading" or "para".
+
+    Extracted PDF text is hard-wrapped into short lines, so line breaks
+    inside a block are soft: only a "#" line, or a short unpunctuated line
+    standing alone between blank lines, is a heading.
+    """
+    stripped = text.strip()
+    if not stripped:
+        return
+    if stripped[0] in "{[" and stripped[-1] in "}]":
+        yield "record", normalize_ws(stripped)
+        return
+    for block in _BLANK.split(stripped):
+        lines = [_WS.sub(" ", ln).strip() for ln in block.split("\n") if ln.strip()]
+        while lines and lines[0].startswith("#"):
+            yield "heading", lines.pop(0)
+        if not lines:
+            continue
+        if len(lines) == 1 and _is_heading(lines[0]):
+            yield "heading", lines[0]
+        else:
+            yield "para", _unwrap(lines)
+
+
+def iter_token_chunks(texts: Iterable[str], max_tokens: int = 800, overlap: int = 80,
+                      counter: TokenCounter | None = None) -> Iterator[str]:
+    """
+    Structure-preserving chunker over a stream of texts (PDF pages, JSON
+    records, ...), measured in real tokens.
+
+    Paragraphs and JSON records are packed whole while they fit in
+    `max_tokens`; oversized ones fall back to sentence and then hard token
+    splits. A heading flushes a half-full chunk so it starts the next one
+    instead of dangling at the end. Each chunk starts with up to `overlap`
+    tokens from the end of the previous one: whole trailing units, then
+    trailing sentences of the unit before them (never a piece of a record).
+
+    Every unit is tokenized once and only the current window is held, so
+    the generator is linear in input size with bounded memory.
+    """
+    counter = counter or TokenCounter()
+    overlap = max(0, min(overlap, max_tokens // 2))
+    units: deque = deque()   # (text, tokens, starts_block, kind)
+    used = 0
+    fresh = False            # window holds something beyond the carried overlap
+
+    def flush() -> str:
+        nonlocal used, fresh
+        parts = []
+        for text, _, starts_block, _ in units:
+            parts.append(("\n\n" if starts_block else " ") + text if parts else text)
+        chunk = "".join(parts)
+        # carry trailing units (≤ overlap tokens) into the next window
+        carry, carried = deque(), 0
+        while units and carried + units[-1][1] <= overlap:
+            u = units.pop()
+            carry.appendleft(u)
+            carried += u[1]
+        # a paragraph too big to carry whole still gives its last sentences
+        if units and carried < overlap and units[-1][3] != "record":
+            for sentence in reversed(_SENTENCE_END.split(units[-1][0])[1:]):
+                n = counter.count(sentence) + 1
+                if carried + n > overlap:
+                    break
+                carry.appendleft((sentence, n, False, "para"))
+                carried += n
+        units.clear()
+        units.extend(carry)
+        used, fresh = carried, False
+        return chunk
+
+    def push(text: str, n: int, starts_block: bool, kind: str) -> Iterator[str]:
+        nonlocal used, fresh
+        n += 1   # joining separator
+        if used + n > max_tokens and fresh:
+            yield flush()
+        while used + n > max_tokens and units:
+            used -= units.popleft()[1]   # overlap doesn't fit next to this unit
+        units.append((text, n, starts_block, kind))
+        used += n
+        fresh = True
+
+    for piece in texts:
+        for kind, block in _blocks(piece or ""):
+            n = counter.count(block)
+            if kind == "heading" and fresh and used > max_tokens // 2:
+                yield flush()
+            if n < max_tokens:
+                yield from push(block, n, True, kind)
+                continue
+            sentences = [block] if kind == "record" else _SENTENCE_END.split(block)
+            first = True
+            for sentence in sentences:
+                sn = counter.count(sentence)
+                for part in (counter.split(sentence, max_tokens - 1) if sn >= max_tokens else [sentence]):
+                    pn = sn if len(part) == len(sentence) else counter.count(part)
+                    yield from push(part, pn, first, kind)
+                    first = False
+    if fresh:
+        yield flush()
+
+
+def iter_char_chunks(texts: Iterable[str], max_tokens: int = 800) -> Iterator[str]:
+    """
+    Previous char-based chunker (≈4 chars/token): cuts after ". " in the
+    last 40% of the window. Kept for benchmarking against iter_token_chunks.
+    """
+    max_chars = max_tokens * 4
+    buf = ""
+    for piece in texts:
+        piece = normalize_ws(piece)
+        if not piece:
+            continue
+        buf = f"{buf} {piece}" if buf else piece
+        while len(buf) > max_chars:
+            cut = buf.rfind(". ", 0, max_chars)
+            cut = cut + 1 if cut >= int(max_chars * 0.6) else max_chars
+            chunk = buf[:cut].strip()
+            if chunk:
+                yield chunk
+            buf = buf[cut:].lstrip()
+    if buf.strip():
+        yield buf.strip()
@@ -0,0 +1,85 @@
+import threading
+
+import numpy as np
+
+from utils.vector_index import normalize
+
+
+def pack_context(hits, counter, budget_tokens: int = 1500, min_score: float = 0.25,
+                 mmr_lambda: float = 0.7, dup_threshold: float = 0.95, max_chunks: int = 6):
+    """
+    Pick chunks for a prompt from `hits` = [(score, meta, vector), ...]
+    (best first, as from VectorIndex.search(with_vectors=True)).
+
+    Chunks below `min_score` are dropped, then Maximal Marginal Relevance
+    picks the next chunk by `mmr_lambda * relevance - (1 - mmr_lambda) *
+    similarity to what is already picked`; near-duplicates (cosine >=
+    `dup_threshold` to a picked chunk) are skipped outright. Chunks are
+    added while they fit in `budget_tokens`.
+
+    Hits without a vector (e.g. lexical-only matches) are never counted
+    as redundant, but exact duplicate texts are still skipped.
+
+    Returns (context text, info) where info reports candidates, picked,
+    dropped counts and tokens used.
+    """
+    info = {"candidates": len(hits), "below_threshold": 0, "duplicates": 0,
+            "over_budget": 0, "chunks": 0, "tokens": 0}
+    pool = []
+    for score, meta, vec in hits:
+        if score < min_score:
+            info["below_threshold"] += 1
+        elif meta.get("text"):
+            pool.append((score, meta["text"], None if vec is None else normalize(vec)))
+
+    picked: list[tuple[str, np.ndarray | None]] = []
+    used = 0
+    while pool and len(picked) < max_chunks:
+        vecs = [v for _, v in picked if v is not None]
+        texts = {t for t, _ in picked}
+        sel = np.vstack(vecs) if vecs else None
+        redundancy = [1.0 if t in texts else
+                      float(np.max(sel @ v)) if sel is not None and v is not None else 0.0
+                      for _, t, v in pool]
+        best = max(range(len(pool)),
+                   key=lambda i: mmr_lambda * pool[i][0] - (1 - mmr_lambda) * redundancy[i])
+        score, text, vec = pool.pop(best)
+        if redundancy[best] >= dup_threshold:
+            info["duplicates"] += 1
+            continue
+        n = counter.count(text)
+        if used + n > budget_tokens:
+            if picked:
+                info["over_budget"] += 1
+                continue
+            # the single best chunk is larger than the budget: keep its head
+            text = counter.split(text, budget_tokens)[0]
+            n = counter.count(text)
+        picked.append((text, vec))
+        used += n
+    info["chunks"] = len(picked)
+    info["tokens"] = used
+    return "\n\n".join(t for t, _ in picked), info
+
+
+class PackStats:
+    """Running totals of pack_context() info dicts, for a debug endpoint."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.totals = {"candidates": 0, "chunks": 0, "tokens": 0,
+                       "below_threshold": 0, "duplicates": 0, "over_budget": 0}
+        self.last: dict = {}
+
+    def record(self, info: dict):
+        with self._lock:
+            self.calls += 1
+            for key in self.totals:
+                self.totals[key] += info.get(key, 0)
+            self.last = dict(info)
+
+    def stats(self) -> dict:
+        with self._lock:
+            avg = {f"avg_{k}": round(v / self.calls, 1) if self.calls else 0.0 for k, v in self.totals.items()}
+            return {"calls": self.calls, **self.totals, **avg, "last": self.last}
@@ -0,0 +1,107 @@
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+from pymongo import UpdateOne
+
+
+def cache_key(model: str, text: str) -> str:
+    """Content address for an embedding: sha256 of (model, whitespace-normalized text)."""
+    norm = re.sub(r"\s+", " ", (text or "")).strip()
+    return hashlib.sha256(f"{model}\n{norm}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Two-tier embedding cache keyed by `cache_key(model, text)`.
+
+    Tier 1 is a bounded in-process LRU; tier 2 is an optional Mongo
+    collection (`{_id: key, model, embedding, last_used}`) whose TTL index
+    on `last_used` evicts entries not read for `ttl_days`.
+    """
+
+    def __init__(self, collection=None, max_items: int = 5000, ttl_days: int = 30):
+        self._lock = threading.Lock()
+        self._lru: OrderedDict[str, list[float]] = OrderedDict()
+        self.collection = collection
+        self.max_items = max_items
+        self.ttl_days = ttl_days
+        self._indexed = False
+        self.memory_hits = 0
+        self.store_hits = 0
+        self.misses = 0
+
+    def _remember(self, key: str, emb: list[float]):
+        with self._lock:
+            self._lru[key] = emb
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.max_items:
+                self._lru.popitem(last=False)
+
+    def _ensure_ttl_index(self):
+        if self._indexed or self.collection is None:
+            return
+        try:
+            self.collection.create_index("last_used", expireAfterSeconds=self.ttl_days * 86400)
+            self._indexed = True
+        except Exception as e:
+            print("Embedding cache index error:", e)
+
+    def get_many(self, keys: list[str]) -> dict[str, list[float]]:
+        """Return {key: embedding} for every key found in either tier."""
+        found: dict[str, list[float]] = {}
+        with self._lock:
+            for k in keys:
+                emb = self._lru.get(k)
+                if emb is not None:
+                    self._lru.move_to_end(k)
+                    found[k] = emb
+            self.memory_hits += len(found)
+        missing = [k for k in dict.fromkeys(keys) if k not in found]
+        if missing and self.collection is not None:
+            try:
+                docs = list(self.collection.find({"_id": {"$in": missing}}, {"embedding": 1}))
+                if docs:
+                    self.collection.update_many(
+                        {"_id": {"$in": [d["_id"] for d in docs]}},
+                        {"$set": {"last_used": datetime.utcnow()}},
+                    )
+                for d in docs:
+                    found[d["_id"]] = d["embedding"]
+                    self._remember(d["_id"], d["embedding"])
+                with self._lock:
+                    self.store_hits += len(docs)
+            except Exception as e:
+                print("Embedding cache read error:", e)
+        with self._lock:
+            self.misses += len([k for k in missing if k not in found])
+        return found
+
+    def put_many(self, model: str, items: dict[str, list[float]]):
+        for k, emb in items.items():
+            self._remember(k, emb)
+        if not items or self.collection is None:
+            return
+        self._ensure_ttl_index()
+        now = datetime.utcnow()
+        try:
+            self.collection.bulk_write(
+                [UpdateOne({"_id": k}, {"$set": {"model": model, "embedding": emb, "last_used": now}}, upsert=True)
+                 for k, emb in items.items()],
+                ordered=False,
+            )
+        except Exception as e:
+            print("Embedding cache write error:", e)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.memory_hits + self.store_hits + self.misses
+            return {
+                "memory_items": len(self._lru),
+                "memory_hits": self.memory_hits,
+                "store_hits": self.store_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.memory_hits + self.store_hits) / lookups, 4) if lookups else 0.0,
+            }
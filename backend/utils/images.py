@@ -0,0 +1,41 @@
+import io
+
+from PIL import Image, ImageOps
+
+
+def _encode(img: Image.Image, fmt: str, quality: int) -> bytes:
+    out = io.BytesIO()
+    if fmt == "JPEG":
+        img.convert("RGB").save(out, "JPEG", quality=quality, optimize=True, progressive=True)
+    else:
+        img.save(out, fmt, quality=quality, method=4)
+    return out.getvalue()
+
+
+def prepare_photo(data: bytes, max_dim: int = 1600, fmt: str = "JPEG", quality: int = 82,
+                  thumb_dim: int = 0) -> tuple[bytes, bytes | None]:
+    """
+    Decode an uploaded photo, apply its EXIF orientation, downscale so the
+    longest side is <= `max_dim` and re-encode as `fmt` ("JPEG"/"WEBP").
+    Re-encoding drops all EXIF (incl. GPS). Returns (photo, thumbnail or
+    None); undecodable input (e.g. HEIC) is returned unchanged.
+
+    Top-level and pure so it can run in a ProcessPoolExecutor.
+    """
+    try:
+        img = Image.open(io.BytesIO(data))
+        img = ImageOps.exif_transpose(img)
+        img.load()
+    except Exception as e:
+        print("Photo decode failed, uploading original:", e)
+        return data, None
+    if img.mode not in ("RGB", "RGBA", "L"):
+        img = img.convert("RGBA" if "A" in img.getbands() else "RGB")
+    img.thumbnail((max_dim, max_dim), Image.LANCZOS)
+    photo = _encode(img, fmt, quality)
+    thumb = None
+    if thumb_dim:
+        small = img.copy()
+        small.thumbnail((thumb_dim, thumb_dim), Image.LANCZOS)
+        thumb = _encode(small, fmt, quality)
+    return photo, thumb
@@ -0,0 +1,92 @@
+import queue
+import threading
+import time
+import traceback
+from collections import deque
+
+
+class KeyedWorkerPool:
+    """
+    Shared pool of worker threads draining one FIFO per key.
+
+    Jobs for one key (a Telegram chat_id) run in submission order, at most
+    one at a time; any idle worker picks up the next key that has work, so
+    a slow job only delays later jobs of its own key, never other keys.
+    A key goes back to the end of the ready line after each job, so a busy
+    chat cannot starve the others. Worker threads start with the first
+    submit(), so merely importing a module that builds a pool starts none.
+    """
+
+    def __init__(self, workers: int = 4, name: str = "worker"):
+        self.name = name
+        self.workers = max(1, workers)
+        self._pending: dict = {}                  # key → deque of jobs not started yet
+        self._ready: queue.Queue = queue.Queue()  # keys with work and nothing in flight
+        self._lock = threading.Lock()
+        self.busy = 0
+        self.submitted = 0
+        self.processed = 0
+        self.errors = 0
+        self._wait_total = 0.0       # seconds spent queued
+        self._run_total = 0.0        # seconds spent in the handler
+        self._run_max = 0.0
+        self._started = False
+
+    def submit(self, key, fn, *args, **kwargs):
+        with self._lock:
+            if not self._started:
+                self._started = True
+                for i in range(self.workers):
+                    threading.Thread(target=self._loop, name=f"{self.name}-{i}", daemon=True).start()
+            self.submitted += 1
+            jobs = self._pending.get(key)
+            if jobs is None:
+                # idle key: nothing queued or running for it
+                jobs = self._pending[key] = deque()
+                self._ready.put(key)
+            jobs.append((time.monotonic(), fn, args, kwargs))
+
+    def _loop(self):
+        while True:
+            key = self._ready.get()
+            with self._lock:
+                enqueued, fn, args, kwargs = self._pending[key].popleft()
+                self.busy += 1
+            started = time.monotonic()
+            ok = True
+            try:
+                fn(*args, **kwargs)
+            except Exception as e:
+                ok = False
+                print(f"{self.name} job failed:", e)
+                traceback.print_exc()
+            finally:
+                done = time.monotonic()
+                with self._lock:
+                    self.busy -= 1
+                    self.processed += 1
+                    self.errors += 0 if ok else 1
+                    self._wait_total += started - enqueued
+                    self._run_total += done - started
+                    self._run_max = max(self._run_max, done - started)
+                    if self._pending[key]:
+                        self._ready.put(key)
+                    else:
+                        del self._pending[key]
+
+    def metrics(self) -> dict:
+        with self._lock:
+            n = self.processed or 1
+            return {
+                "workers": self.workers,
+                "busy_workers": self.busy,
+                "queue_depth": sum(len(jobs) for jobs in self._pending.values()),
+                "keys_waiting": self._ready.qsize(),
+                "max_key_depth": max((len(jobs) for jobs in self._pending.values()), default=0),
+                "submitted": self.submitted,
+                "processed": self.processed,
+                "errors": self.errors,
+                "avg_wait_ms": round(1000 * self._wait_total / n, 1),
+                "avg_run_ms": round(1000 * self._run_total / n, 1),
+                "max_run_ms": round(1000 * self._run_max, 1),
+            }
@@ -0,0 +1,153 @@
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+
+# emails, numbers with separators (amounts, ids), then plain words (any script)
+_TOKEN = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+|\d+(?:[.,:/-]\d+)*|\w+", re.UNICODE)
+
+
+# Function words of the bot's languages (en/es/pt/ru/sr); dropped from queries
+# so "how much is the pay?" only matches on content terms.
+STOPWORDS = frozenset("""
+a an and are as at be but by can do does for from have how i if in is it its me my of on or so that the
+their there this to was we what when where which who why will with you your
+al como con cual cuanto cuánto de del el en es la las lo los me mi para pero por que qué se su sus un una y yo
+as ao com como da das de do dos e em eu o os para pela pelo por quanto que qual se seu sua um uma é
+а в во да для же и из как какой ли мне мой на не но о от по при с сколько так то у что это я
+ali da do i ili je kako koji li mi na ne od po sa se su šta što to u za
+""".split())
+
+
+def tokenize(text: str) -> list[str]:
+    return [t.lower() for t in _TOKEN.findall(text or "")]
+
+
+class BM25Index:
+    """
+    In-memory Okapi BM25 inverted index over knowledge chunk texts.
+
+    Mirrors VectorIndex's interface (reset / add / remove / replace /
+    search / ensure_loaded) so both can be kept in sync with Mongo by the
+    same calls. Postings are term → {row id: term frequency}; a query only
+    touches the postings of its own terms, so it needs no embedding call.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, meta_fields=("text", "name", "doc_id")):
+        self.k1 = k1
+        self.b = b
+        self.meta_fields = tuple(meta_fields)
+        self._lock = threading.RLock()
+        self._postings: dict[str, dict[str, int]] = defaultdict(dict)
+        self._terms: dict[str, list[str]] = {}    # row id → its distinct terms
+        self._len: dict[str, int] = {}            # row id → token count
+        self._meta: dict[str, dict] = {}
+        self._total_len = 0
+        self.loaded = False
+
+    def __len__(self) -> int:
+        return len(self._meta)
+
+    def ensure_loaded(self, populate):
+        """Run `populate(self)` once, on first use."""
+        if self.loaded:
+            return
+        with self._lock:
+            if not self.loaded:
+                populate(self)
+                self.loaded = True
+
+    def reset(self, rows):
+        with self._lock:
+            self._postings.clear()
+            self._terms.clear()
+            self._len.clear()
+            self._meta.clear()
+            self._total_len = 0
+            self.add(rows)
+            self.loaded = True
+
+    def add(self, rows) -> int:
+        """Index rows shaped like Mongo knowledge docs (`{"_id", "text", ...}`)."""
+        added = 0
+        with self._lock:
+            for row in rows:
+                rid = str(row.get("_id"))
+                if rid in self._meta:
+                    self._drop(rid)
+                tf = Counter(tokenize(row.get("text", "")))
+                for term, n in tf.items():
+                    self._postings[term][rid] = n
+                self._terms[rid] = list(tf)
+                self._len[rid] = sum(tf.values())
+                self._total_len += self._len[rid]
+                self._meta[rid] = {k: row.get(k) for k in self.meta_fields}
+                added += 1
+        return added
+
+    def _drop(self, rid: str):
+        for term in self._terms.pop(rid, []):
+            posting = self._postings.get(term)
+            if posting is not None:
+                posting.pop(rid, None)
+                if not posting:
+                    del self._postings[term]
+        self._total_len -= self._len.pop(rid, 0)
+        self._meta.pop(rid, None)
+
+    def remove(self, predicate) -> int:
+        """Drop every row whose metadata satisfies `predicate(meta)`."""
+        with self._lock:
+            gone = [rid for rid, m in self._meta.items() if predicate(m)]
+            for rid in gone:
+                self._drop(rid)
+            return len(gone)
+
+    def replace(self, predicate, rows) -> int:
+        with self._lock:
+            self.remove(predicate)
+            return self.add(rows)
+
+    def search(self, query: str, k: int = 6, min_score: float = 0.0) -> list[tuple[float, dict]]:
+        """
+        Top-k rows by BM25 → [(score, meta), ...] best first. Stopwords are
+        ignored, and rows sharing no term or scoring below `min_score` are
+        skipped.
+        """
+        terms = set(tokenize(query)) - STOPWORDS
+        with self._lock:
+            n = len(self._meta)
+            if not n or not terms or k <= 0:
+                return []
+            avg_len = self._total_len / n or 1.0
+            scores: dict[str, float] = defaultdict(float)
+            for term in terms:
+                posting = self._postings.get(term)
+                if not posting:
+                    continue
+                idf = math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+                for rid, tf in posting.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._len[rid] / avg_len)
+                    scores[rid] += idf * tf * (self.k1 + 1) / (tf + norm)
+            top = sorted(((rid, sc) for rid, sc in scores.items() if sc >= min_score), key=lambda kv: -kv[1])[:k]
+            return [(score, self._meta[rid]) for rid, score in top]
+
+
+def reciprocal_rank_fusion(result_lists, key, k: int = 60) -> list[tuple]:
+    """
+    Fuse ranked lists of hits (tuples with meta at index 1) by reciprocal
+    rank: score = sum(1 / (k + rank)). Hits are identified by `key(hit)`;
+    the first list a hit appears in supplies its tuple. Returns
+    [(fused score, *hit[1:]), ...] best first.
+    """
+    fused: dict = {}
+    for hits in result_lists:
+        for rank, hit in enumerate(hits, start=1):
+            kk = key(hit)
+            score = 1.0 / (k + rank)
+            if kk in fused:
+                fused[kk][0] += score
+            else:
+                fused[kk] = [score, hit]
+    ranked = sorted(fused.values(), key=lambda sh: -sh[0])
+    return [(score, *hit[1:]) for score, hit in ranked]
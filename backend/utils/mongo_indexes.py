@@ -0,0 +1,52 @@
+from pymongo.errors import OperationFailure
+
+
+def ensure_indexes(specs) -> list[str]:
+    """
+    Idempotently create indexes from `specs`:
+    [(collection, keys, {"unique": bool, ...}), ...]. A unique index that
+    fails on existing duplicates is created non-unique with a warning, so
+    boot never breaks on legacy data. Returns created index names.
+    """
+    names = []
+    for coll, keys, opts in specs:
+        try:
+            names.append(coll.create_index(keys, **opts))
+        except OperationFailure as e:
+            if opts.get("unique") and e.code == 11000:
+                print(f"⚠️ Duplicates in {coll.name} {keys}; creating non-unique index instead")
+                names.append(coll.create_index(keys, **{**opts, "unique": False}))
+            else:
+                print(f"⚠️ Index {coll.name} {keys} failed:", e)
+    return names
+
+
+def _stages(plan: dict):
+    """Yield every stage name in an explain() plan tree."""
+    if not isinstance(plan, dict):
+        return
+    if "stage" in plan:
+        yield plan["stage"]
+    for key in ("inputStage", "queryPlan"):
+        yield from _stages(plan.get(key))
+    for child in plan.get("inputStages", []):
+        yield from _stages(child)
+
+
+def verify_plans(queries) -> list[dict]:
+    """
+    explain() each hot query [(label, collection, filter), ...] and report
+    whether the winning plan uses an IXSCAN; warns on collection scans.
+    """
+    report = []
+    for label, coll, flt in queries:
+        try:
+            plan = coll.find(flt).explain().get("queryPlanner", {}).get("winningPlan", {})
+            stages = list(_stages(plan))
+            ok = "IXSCAN" in stages or "IDHACK" in stages or "EXPRESS_IXSCAN" in stages
+            if "COLLSCAN" in stages:
+                print(f"⚠️ COLLSCAN for hot query {label}: {coll.name}.find({flt})")
+            report.append({"query": label, "collection": coll.name, "stages": stages, "uses_index": ok})
+        except Exception as e:
+            report.append({"query": label, "collection": coll.name, "error": str(e), "uses_index": False})
+    return report
@@ -0,0 +1,53 @@
+import os
+import tempfile
+from collections import deque
+
+from pypdf import PdfReader
+
+
+def _extract_range(path: str, start: int, stop: int) -> list[str]:
+    """Text of pages [start, stop) — runs inside a worker process."""
+    reader = PdfReader(path)
+    return [(reader.pages[i].extract_text() or "") for i in range(start, stop)]
+
+
+def iter_pdf_pages(source, pool=None, pages_per_task: int = 8, window: int = 8):
+    """
+    Yield page texts of a PDF (path or bytes) in page order.
+
+    With a ProcessPoolExecutor, page ranges of `pages_per_task` are
+    extracted in parallel, at most `window` ranges in flight, so callers
+    can start chunking/embedding early pages while later ones are still
+    being parsed and memory stays bounded. Workers read the file by path,
+    so the PDF bytes are not copied to every task.
+    """
+    tmp = None
+    if isinstance(source, (bytes, bytearray)):
+        fd, tmp = tempfile.mkstemp(suffix=".pdf")
+        with os.fdopen(fd, "wb") as f:
+            f.write(source)
+        path = tmp
+    else:
+        path = source
+    try:
+        n = len(PdfReader(path).pages)
+        ranges = [(i, min(n, i + pages_per_task)) for i in range(0, n, pages_per_task)]
+        if pool is None or len(ranges) <= 1:
+            for start, stop in ranges:
+                yield from _extract_range(path, start, stop)
+            return
+        pending = deque()
+        todo = iter(ranges)
+        for start, stop in todo:
+            pending.append(pool.submit(_extract_range, path, start, stop))
+            if len(pending) >= window:
+                break
+        while pending:
+            pages = pending.popleft().result()
+            nxt = next(todo, None)
+            if nxt:
+                pending.append(pool.submit(_extract_range, path, *nxt))
+            yield from pages
+    finally:
+        if tmp:
+            os.unlink(tmp)
@@ -0,0 +1,124 @@
+import threading
+import time
+from collections import OrderedDict
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+
+class SessionConflict(Exception):
+    """Another process changed the session since it was read (mode="cas")."""
+
+
+class SessionCache:
+    """
+    Bounded, TTL-evicting write-through cache of bot sessions keyed by chat_id.
+
+    Every write goes to Mongo first and then updates the cached copy, so
+    reads are served from memory. Each document carries a `version` that
+    is incremented on every write.
+
+    mode="local": one process owns the sessions; writes are plain upserts.
+    mode="cas":   several processes share `collection`. Cached reads are
+                  revalidated with a version-only lookup, and a write is a
+                  compare-and-set against the version the caller last read;
+                  if another process wrote in between, SessionConflict is
+                  raised so the caller can re-run its transition on the
+                  fresh document.
+    """
+
+    def __init__(self, collection, max_items: int = 10000, ttl: float = 600, mode: str = "local"):
+        if mode not in ("local", "cas"):
+            raise ValueError(f"Unknown session cache mode: {mode!r}")
+        self.collection = collection
+        self.max_items = max_items
+        self.ttl = ttl
+        self.mode = mode
+        self._lock = threading.Lock()
+        self._items: OrderedDict = OrderedDict()   # chat_id → (expires_at, doc)
+        self.hits = 0
+        self.misses = 0
+        self.conflicts = 0
+        self.stale = 0
+
+    def _put(self, chat_id, doc: dict):
+        with self._lock:
+            self._items[chat_id] = (time.monotonic() + self.ttl, doc)
+            self._items.move_to_end(chat_id)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def _cached(self, chat_id):
+        with self._lock:
+            entry = self._items.get(chat_id)
+            if entry and entry[0] > time.monotonic():
+                self._items.move_to_end(chat_id)
+                self.hits += 1
+                return entry[1]
+            self._items.pop(chat_id, None)
+            self.misses += 1
+            return None
+
+    def invalidate(self, chat_id):
+        with self._lock:
+            self._items.pop(chat_id, None)
+
+    def _peek(self, chat_id):
+        with self._lock:
+            entry = self._items.get(chat_id)
+            return entry[1] if entry and entry[0] > time.monotonic() else None
+
+    def get(self, chat_id) -> dict:
+        doc = self._cached(chat_id)
+        if doc is not None and self.mode == "cas":
+            head = self.collection.find_one({"chat_id": chat_id}, {"_id": 0, "version": 1})
+            if (head or {}).get("version") != doc.get("version"):
+                with self._lock:
+                    self.stale += 1
+                doc = None
+        if doc is None:
+            doc = self.collection.find_one({"chat_id": chat_id}) or {}
+            self._put(chat_id, doc)
+        return dict(doc)
+
+    def set(self, chat_id, **fields):
+        if self.mode == "local":
+            # same single round trip as update_one, but hands back the full document
+            doc = self.collection.find_one_and_update(
+                {"chat_id": chat_id},
+                {"$set": fields, "$setOnInsert": {"chat_id": chat_id}, "$inc": {"version": 1}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+            self._put(chat_id, doc)
+            return
+
+        current = self._peek(chat_id)
+        if current is None:
+            current = self.get(chat_id)
+        version = current.get("version", 0)
+        if not current:
+            try:
+                self.collection.insert_one({"chat_id": chat_id, **fields, "version": 1})
+                self._put(chat_id, {"chat_id": chat_id, **fields, "version": 1})
+                return
+            except DuplicateKeyError:
+                pass
+        else:
+            expected = version if version else {"$in": [None, 0]}
+            res = self.collection.update_one(
+                {"chat_id": chat_id, "version": expected},
+                {"$set": fields, "$inc": {"version": 1}},
+            )
+            if res.matched_count:
+                self._put(chat_id, {**current, **fields, "version": version + 1})
+                return
+        with self._lock:
+            self.conflicts += 1
+        self.invalidate(chat_id)
+        raise SessionConflict(f"Session for chat {chat_id} changed since it was read")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"mode": self.mode, "items": len(self._items), "hits": self.hits,
+                    "misses": self.misses, "conflicts": self.conflicts, "stale": self.stale}
@@ -0,0 +1,73 @@
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class TelegramClient:
+    """
+    Thin Bot API client over one pooled keep-alive `requests.Session`.
+
+    Every call has a timeout; HTTP 429 responses are retried after the
+    `parameters.retry_after` Telegram returns, and network errors are
+    retried with exponential backoff. Calls return `(status_code, body)`
+    where `body` is the decoded JSON reply (or `{"ok": False, ...}`).
+
+    Callers that schedule their own retries (TelegramSendQueue) pass
+    `retries=0` so a rate-limited call does not sleep in the caller's thread.
+    """
+
+    API_URL = "https://api.telegram.org/bot{token}/{method}"
+
+    def __init__(self, token: str, timeout: float = 15, pool_size: int = 20, max_retries: int = 3):
+        self.token = (token or "").strip()
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+
+    def call(self, method: str, payload: dict, timeout: float | None = None,
+             retries: int | None = None) -> tuple[int, dict]:
+        if not self.token:
+            return 0, {"ok": False, "description": "TELEGRAM_BOT_TOKEN not set"}
+        url = self.API_URL.format(token=self.token, method=method)
+        retries = self.max_retries if retries is None else retries
+        delay = 1.0
+        for attempt in range(retries + 1):
+            last = attempt == retries
+            try:
+                r = self.session.post(url, json=payload, timeout=timeout or self.timeout)
+            except requests.RequestException as e:
+                if last:
+                    print(f"Telegram {method} error:", e)
+                    return 500, {"ok": False, "description": str(e)}
+                time.sleep(delay)
+                delay *= 2
+                continue
+            try:
+                body = r.json()
+            except ValueError:
+                body = {"ok": False, "description": r.text}
+            if r.status_code == 429 and not last:
+                retry_after = (body.get("parameters") or {}).get("retry_after", delay)
+                print(f"Telegram {method} rate-limited; retrying in {retry_after}s")
+                time.sleep(float(retry_after))
+                delay *= 2
+                continue
+            if r.status_code != 200:
+                print(f"Telegram {method} error:", r.status_code, body.get("description"))
+            return r.status_code, body
+        return 500, {"ok": False, "description": "retries exhausted"}
+
+    def send_message(self, chat_id, text: str, reply_markup=None, parse_mode=None, **extra) -> tuple[int, dict]:
+        payload = {"chat_id": chat_id, "text": text, **extra}
+        if parse_mode:
+            payload["parse_mode"] = parse_mode
+        if reply_markup:
+            payload["reply_markup"] = reply_markup
+        return self.call("sendMessage", payload)
+
+    def send_media_group(self, chat_id, photo_urls: list[str]) -> tuple[int, dict]:
+        media = [{"type": "photo", "media": u} for u in photo_urls[:10]]
+        return self.call("sendMediaGroup", {"chat_id": chat_id, "media": media}, timeout=20)
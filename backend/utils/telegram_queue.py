@@ -0,0 +1,254 @@
+import atexit
+import itertools
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from datetime import datetime
+
+PRIORITY_INTERACTIVE = 0   # replies to applicants in the bot flow
+PRIORITY_BULK = 1          # admin forwards / notifications
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens/second, up to `burst` banked."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until one token is available (0 if available now)."""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+    def pause(self, now: float, seconds: float):
+        """Hold the next token back for at least `seconds` (e.g. Telegram's retry_after)."""
+        self._refill(now)
+        self.tokens = min(self.tokens, 1 - seconds * self.rate)
+
+
+def _chat_key(chat_id):
+    """Numeric chat ids as int, whether they came from config (str) or an update (int)."""
+    if isinstance(chat_id, str) and chat_id.strip().lstrip("-").isdigit():
+        return int(chat_id)
+    return chat_id
+
+
+class _Item:
+    __slots__ = ("seq", "chat_id", "method", "payload", "priority", "attempts", "enqueued", "future")
+
+    def __init__(self, seq, chat_id, method, payload, priority, attempts=0):
+        self.seq = seq
+        self.chat_id = chat_id
+        self.method = method
+        self.payload = payload
+        self.priority = priority
+        self.attempts = attempts
+        self.enqueued = time.monotonic()
+        self.future = Future()
+
+
+class TelegramSendQueue:
+    """
+    Background, rate-limited outbound queue in front of a TelegramClient.
+
+    - A global token bucket (Telegram: ~30 msg/s per bot) and one bucket per
+      chat (~1 msg/s, small burst) gate every call.
+    - Messages for one chat are delivered strictly in order, one at a time;
+      among chats that are ready, the lowest priority lane wins, so
+      applicant replies overtake bulk admin forwards.
+    - Transient failures are retried here, not in the client (it is called
+      with retries=0): a 429's `retry_after` pauses the chat's and the
+      global bucket, other transient errors back off on the chat's bucket.
+      Messages that still cannot be delivered (or are pending at shutdown)
+      are written to `store` (a Mongo collection) and re-enqueued on the
+      next `start()`.
+    """
+
+    def __init__(self, client, store=None, global_rate: float = 30, chat_rate: float = 1,
+                 chat_burst: float = 3, senders: int = 4, max_attempts: int = 4):
+        self.client = client
+        self.store = store
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.senders = senders
+        self.max_attempts = max_attempts
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chat_buckets: dict = {}
+        self._pending: dict = {}          # chat_id → deque[_Item]
+        self._inflight: set = set()       # chat_ids with a call in progress
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._started = False
+        self.stats_counters = {"enqueued": 0, "sent": 0, "retried": 0, "failed": 0, "dead_lettered": 0}
+        self._delay_total = 0.0
+
+    # ---- producer side ----
+    def send(self, method: str, payload: dict, priority: int = PRIORITY_INTERACTIVE, _attempts: int = 0) -> Future:
+        chat_id = _chat_key(payload.get("chat_id"))
+        if chat_id != payload.get("chat_id"):
+            payload = {**payload, "chat_id": chat_id}
+        item = _Item(next(self._seq), chat_id, method, payload, priority, _attempts)
+        with self._cond:
+            self._pending.setdefault(chat_id, deque()).append(item)
+            self.stats_counters["enqueued"] += 1
+            self._cond.notify()
+        return item.future
+
+    def send_message(self, chat_id, text, reply_markup=None, parse_mode=None,
+                     priority: int = PRIORITY_INTERACTIVE, **extra) -> Future:
+        payload = {"chat_id": chat_id, "text": text, **extra}
+        if parse_mode:
+            payload["parse_mode"] = parse_mode
+        if reply_markup:
+            payload["reply_markup"] = reply_markup
+        return self.send("sendMessage", payload, priority)
+
+    def send_media_group(self, chat_id, photo_urls: list[str], priority: int = PRIORITY_BULK) -> Future:
+        media = [{"type": "photo", "media": u} for u in photo_urls[:10]]
+        return self.send("sendMediaGroup", {"chat_id": chat_id, "media": media}, priority)
+
+    # ---- lifecycle ----
+    def start(self):
+        if self._started:
+            return
+        self._started = True
+        threading.Thread(target=self._restore, name="tg-restore", daemon=True).start()
+        for i in range(self.senders):
+            threading.Thread(target=self._loop, name=f"tg-sender-{i}", daemon=True).start()
+        atexit.register(self._persist_pending)
+
+    def _restore(self):
+        if self.store is None:
+            return
+        try:
+            docs = list(self.store.find({"status": "pending"}).sort("seq", 1))
+            for d in docs:
+                self.send(d["method"], d["payload"], d.get("priority", PRIORITY_BULK), d.get("attempts", 0))
+            if docs:
+                self.store.delete_many({"_id": {"$in": [d["_id"] for d in docs]}})
+                print(f"Telegram queue: restored {len(docs)} undelivered messages")
+        except Exception as e:
+            print("Telegram queue restore failed:", e)
+
+    def _persist(self, items, status: str, error: str = ""):
+        if self.store is None or not items:
+            return
+        try:
+            self.store.insert_many([{
+                "seq": it.seq, "method": it.method, "payload": it.payload, "priority": it.priority,
+                "attempts": it.attempts, "status": status, "error": error, "created_at": datetime.utcnow(),
+            } for it in items])
+        except Exception as e:
+            print("Telegram queue persist failed:", e)
+
+    def _persist_pending(self):
+        with self._cond:
+            items = [it for dq in self._pending.values() for it in dq]
+            self._pending.clear()
+        self._persist(items, "pending")
+
+    # ---- scheduler ----
+    def _chat_bucket(self, chat_id) -> TokenBucket:
+        b = self._chat_buckets.get(chat_id)
+        if b is None:
+            if len(self._chat_buckets) > 10000:
+                # forget idle chats; a fresh bucket starts full, so only drop refilled ones
+                now = time.monotonic()
+                for cid in [c for c, bk in self._chat_buckets.items()
+                            if c not in self._pending and bk.wait_time(now) == 0 and bk.tokens >= bk.burst]:
+                    del self._chat_buckets[cid]
+            b = self._chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return b
+
+    def _next_item(self) -> _Item:
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                best, wake = None, None
+                for chat_id, dq in self._pending.items():
+                    if chat_id in self._inflight:
+                        continue
+                    w = self._chat_bucket(chat_id).wait_time(now)
+                    if w > 0:
+                        wake = w if wake is None else min(wake, w)
+                        continue
+                    head = dq[0]
+                    if best is None or (head.priority, head.seq) < (best.priority, best.seq):
+                        best = head
+                if best is None:
+                    self._cond.wait(timeout=wake)
+                    continue
+                gw = self._global.wait_time(now)
+                if gw > 0:
+                    self._cond.wait(timeout=gw)
+                    continue
+                self._global.take(now)
+                self._chat_bucket(best.chat_id).take(now)
+                dq = self._pending[best.chat_id]
+                dq.popleft()
+                if not dq:
+                    del self._pending[best.chat_id]
+                self._inflight.add(best.chat_id)
+                return best
+
+    def _loop(self):
+        while True:
+            item = self._next_item()
+            status, body = self.client.call(item.method, item.payload, retries=0)
+            item.attempts += 1
+            if (status == 400 and item.method == "editMessageText"
+                    and "message is not modified" in str(body.get("description", ""))):
+                status = 200   # the message already shows this text: nothing to deliver
+            with self._cond:
+                self._inflight.discard(item.chat_id)
+                if status == 200:
+                    self.stats_counters["sent"] += 1
+                    self._delay_total += time.monotonic() - item.enqueued
+                elif (status == 429 or status >= 500) and item.attempts < self.max_attempts:
+                    # transient: put it back at the head of its chat to keep ordering
+                    self.stats_counters["retried"] += 1
+                    now = time.monotonic()
+                    retry_after = (body.get("parameters") or {}).get("retry_after")
+                    if status == 429 and retry_after:
+                        self._chat_bucket(item.chat_id).pause(now, float(retry_after))
+                        self._global.pause(now, float(retry_after))
+                    else:
+                        self._chat_bucket(item.chat_id).pause(now, min(30.0, 2.0 ** item.attempts))
+                    self._pending.setdefault(item.chat_id, deque()).appendleft(item)
+                    self._cond.notify()
+                    continue
+                else:
+                    self.stats_counters["failed"] += 1
+                    if self.store is not None:
+                        self.stats_counters["dead_lettered"] += 1
+                self._cond.notify()
+            if status != 200:
+                self._persist([item], "failed", str(body.get("description", "")))
+            item.future.set_result((status, body))
+
+    def stats(self) -> dict:
+        with self._cond:
+            lanes: dict[int, int] = {}
+            for dq in self._pending.values():
+                for it in dq:
+                    lanes[it.priority] = lanes.get(it.priority, 0) + 1
+            sent = self.stats_counters["sent"]
+            return {
+                **self.stats_counters,
+                "pending_interactive": lanes.get(PRIORITY_INTERACTIVE, 0),
+                "pending_bulk": lanes.get(PRIORITY_BULK, 0),
+                "chats_waiting": len(self._pending),
+                "avg_delivery_ms": round(1000 * self._delay_total / sent, 1) if sent else 0.0,
+            }
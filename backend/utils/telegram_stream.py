@@ -0,0 +1,120 @@
+import re
+import threading
+import time
+
+from utils.telegram_queue import PRIORITY_INTERACTIVE
+
+TELEGRAM_TEXT_LIMIT = 4096
+_MARKUP_CHARS = re.compile(r"[*_`\[]")
+
+
+class TelegramStreamWriter:
+    """
+    Shows a reply while it is being generated: the first text fragment is
+    sent as a message and later fragments are applied with throttled
+    `editMessageText` calls, then `finish()` writes the final text (with
+    `parse_mode`).
+
+    Everything goes through the TelegramSendQueue, so edits share the
+    chat's rate limit with other sends. At most one edit is in flight and
+    at most one per `min_interval` seconds; fragments arriving meanwhile
+    are coalesced into the next edit. Intermediate edits are plain text,
+    since half a Markdown entity would be rejected.
+    """
+
+    def __init__(self, queue, chat_id, min_interval: float = 1.2, first_chars: int = 1,
+                 priority: int = PRIORITY_INTERACTIVE):
+        self.queue = queue
+        self.chat_id = chat_id
+        self.min_interval = min_interval
+        self.first_chars = first_chars
+        self.priority = priority
+        self.text = ""
+        self._lock = threading.Lock()
+        self._first = None       # Future of the initial sendMessage
+        self._edit = None        # Future of the edit in flight
+        self._shown = ""
+        self._last_edit = 0.0
+
+    @property
+    def started(self) -> bool:
+        return self._first is not None
+
+    def _message_id(self):
+        if self._first is None or not self._first.done():
+            return None
+        status, body = self._first.result()
+        return (body.get("result") or {}).get("message_id") if status == 200 else None
+
+    def _display(self) -> str:
+        return self.text[:TELEGRAM_TEXT_LIMIT - 1] + "…" if len(self.text) >= TELEGRAM_TEXT_LIMIT else self.text
+
+    def feed(self, delta: str):
+        """Append a streamed fragment and update the visible message if allowed."""
+        with self._lock:
+            self.text += delta or ""
+            if not self.text.strip():
+                return
+            if self._first is None:
+                if len(self.text.strip()) >= self.first_chars:
+                    self._shown = self._display()
+                    self._first = self.queue.send_message(self.chat_id, self._shown, priority=self.priority)
+                    self._last_edit = time.monotonic()
+                return
+            message_id = self._message_id()
+            now = time.monotonic()
+            if (message_id is None or (self._edit is not None and not self._edit.done())
+                    or now - self._last_edit < self.min_interval):
+                return
+            shown = self._display()
+            if shown != self._shown:
+                self._shown = shown
+                self._last_edit = now
+                self._edit = self.queue.send("editMessageText", {
+                    "chat_id": self.chat_id, "message_id": message_id, "text": shown,
+                }, self.priority)
+
+    def _plain_fallback(self, payload: dict):
+        """Done-callback: re-send a rejected Markdown edit as plain text."""
+        def retry(fut):
+            status, _ = fut.result()
+            if status == 400:
+                self.queue.send("editMessageText", {k: v for k, v in payload.items() if k != "parse_mode"},
+                                self.priority)
+        return retry
+
+    def finish(self, text: str, parse_mode: str | None = None, timeout: float = 30):
+        """
+        Write the final `text`: a normal message if nothing was streamed,
+        otherwise a last edit (retried without parse_mode if Telegram
+        rejects the markup). Text beyond Telegram's limit goes out as
+        follow-up messages.
+
+        Only the first message's id is waited for (up to `timeout`); the
+        final edit is queued, not awaited, so a rate-limited or backed-up
+        queue never raises into the caller.
+        """
+        head, rest = text[:TELEGRAM_TEXT_LIMIT], text[TELEGRAM_TEXT_LIMIT:]
+        with self._lock:
+            first = self._first
+        if first is None:
+            self.queue.send_message(self.chat_id, head, parse_mode=parse_mode, priority=self.priority)
+        else:
+            try:
+                status, body = first.result(timeout=timeout)
+            except Exception:
+                status, body = 0, {}
+            message_id = (body.get("result") or {}).get("message_id") if status == 200 else None
+            if message_id is None:
+                self.queue.send_message(self.chat_id, head, parse_mode=parse_mode, priority=self.priority)
+            elif head != self._shown or (parse_mode and _MARKUP_CHARS.search(head)):
+                # re-sending the same plain text would only be rejected as "not modified"
+                payload = {"chat_id": self.chat_id, "message_id": message_id, "text": head}
+                if parse_mode:
+                    payload["parse_mode"] = parse_mode
+                edit = self.queue.send("editMessageText", payload, self.priority)
+                if parse_mode and head != self._shown:
+                    edit.add_done_callback(self._plain_fallback(payload))
+        for i in range(0, len(rest), TELEGRAM_TEXT_LIMIT):
+            self.queue.send_message(self.chat_id, rest[i:i + TELEGRAM_TEXT_LIMIT], parse_mode=parse_mode,
+                                    priority=self.priority)
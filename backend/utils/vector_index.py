@@ -0,0 +1,396 @@
+import fcntl
+import glob
+import io
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+import numpy as np
+
+
+def normalize(v) -> np.ndarray:
+    """Return `v` as a float32 unit vector (zero vectors stay zero)."""
+    v = np.asarray(v, dtype=np.float32).reshape(-1)
+    n = float(np.linalg.norm(v))
+    return v / n if n > 0 else v
+
+
+# =========================
+# Search backends
+# =========================
+class FlatSearch:
+    """Exact search: every row is a candidate."""
+    name = "flat"
+
+    def __init__(self, **_opts):
+        pass
+
+    def fit(self, mat: np.ndarray):
+        pass
+
+    def added(self, mat: np.ndarray, start: int):
+        pass
+
+    def compacted(self, keep: np.ndarray):
+        pass
+
+    def candidates(self, mat: np.ndarray, q: np.ndarray):
+        return None
+
+    def state(self) -> dict:
+        return {}
+
+    def restore(self, state: dict):
+        pass
+
+
+class IVFSearch:
+    """
+    Inverted-file ANN over the resident matrix.
+
+    Rows are bucketed by their nearest of `nlist` spherical k-means
+    centroids; a query is scored exactly against the rows of the `nprobe`
+    closest buckets only. `nprobe` is the recall/latency knob: raising it
+    towards `nlist` converges on exact search. Below `min_rows` the index
+    stays untrained and behaves like FlatSearch.
+
+    The buckets are kept as inverted lists (row ids grouped by bucket plus
+    per-bucket offsets), so a query only touches the rows it scores.
+    """
+    name = "ivf"
+
+    def __init__(self, nprobe: int = 8, min_rows: int = 2048, iters: int = 10, sample: int = 20000, seed: int = 0):
+        self.nprobe = nprobe
+        self.min_rows = min_rows
+        self.iters = iters
+        self.sample = sample
+        self.seed = seed
+        self.centroids = None                       # (nlist, dim) unit vectors
+        self.assign = np.zeros(0, dtype=np.int32)   # bucket id per matrix row
+        self.lists = np.zeros(0, dtype=np.int64)    # row ids grouped by bucket
+        self.offsets = np.zeros(1, dtype=np.int64)  # bucket c = lists[offsets[c]:offsets[c + 1]]
+        self.trained_rows = 0
+
+    def _nearest(self, mat: np.ndarray) -> np.ndarray:
+        out = np.empty(len(mat), dtype=np.int32)
+        for i in range(0, len(mat), 8192):
+            out[i:i + 8192] = np.argmax(mat[i:i + 8192] @ self.centroids.T, axis=1)
+        return out
+
+    def _build_lists(self):
+        # stable argsort of small ints is a radix sort: linear in rows
+        self.lists = np.argsort(self.assign, kind="stable")
+        counts = np.bincount(self.assign, minlength=len(self.centroids))
+        self.offsets = np.concatenate([[0], np.cumsum(counts)])
+
+    def fit(self, mat: np.ndarray):
+        n = len(mat)
+        if n < self.min_rows:
+            self.centroids, self.assign, self.trained_rows = None, np.zeros(0, dtype=np.int32), 0
+            self.lists, self.offsets = np.zeros(0, dtype=np.int64), np.zeros(1, dtype=np.int64)
+            return
+        rng = np.random.default_rng(self.seed)
+        nlist = max(16, int(np.sqrt(n)))
+        train = mat[rng.choice(n, size=min(n, self.sample), replace=False)]
+        cents = train[rng.choice(len(train), size=nlist, replace=False)].copy()
+        for _ in range(self.iters):
+            labels = np.argmax(train @ cents.T, axis=1)
+            for c in range(nlist):
+                members = train[labels == c]
+                if len(members):
+                    cents[c] = normalize(members.sum(axis=0))
+        self.centroids = cents
+        self.assign = self._nearest(mat)
+        self.trained_rows = n
+        self._build_lists()
+
+    def added(self, mat: np.ndarray, start: int):
+        n = len(mat)
+        if self.centroids is None or n > 2 * self.trained_rows:
+            self.fit(mat)   # (re)train once the matrix has doubled since last fit
+            return
+        self.assign = np.concatenate([self.assign[:start], self._nearest(mat[start:])])
+        self._build_lists()
+
+    def compacted(self, keep: np.ndarray):
+        if self.centroids is not None:
+            self.assign = self.assign[keep]
+            self._build_lists()
+
+    def candidates(self, mat: np.ndarray, q: np.ndarray):
+        if self.centroids is None:
+            return None
+        nprobe = min(self.nprobe, len(self.centroids))
+        probe = np.argpartition(-(self.centroids @ q), nprobe - 1)[:nprobe]
+        return np.sort(np.concatenate([self.lists[self.offsets[c]:self.offsets[c + 1]] for c in probe]))
+
+    def state(self) -> dict:
+        if self.centroids is None:
+            return {}
+        return {"centroids": self.centroids, "assign": self.assign,
+                "trained_rows": np.array(self.trained_rows)}
+
+    def restore(self, state: dict):
+        if "centroids" in state:
+            self.centroids = state["centroids"].astype(np.float32)
+            self.assign = state["assign"].astype(np.int32)
+            self.trained_rows = int(state["trained_rows"])
+            self._build_lists()
+
+
+BACKENDS = {"flat": FlatSearch, "ivf": IVFSearch}
+
+
+def make_backend(name: str, **opts):
+    try:
+        cls = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown vector index backend: {name!r}")
+    return cls(**opts)
+
+
+@contextmanager
+def file_lock(path: str):
+    """Exclusive advisory lock on `<path>.lock`, held across processes."""
+    with open(f"{path}.lock", "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+# =========================
+# Resident index
+# =========================
+class VectorIndex:
+    """
+    Resident, pre-normalized float32 matrix of chunk embeddings.
+
+    Row i of the matrix belongs to `ids[i]` / `meta[i]`, so a query is one
+    matrix-vector product (over the backend's candidate rows) plus an
+    argpartition top-k. Rows are appended into a capacity-doubling buffer
+    and removed by compaction, so callers can keep it in sync with Mongo
+    without reloading the collection.
+
+    On disk the matrix is a plain .npy memory-mapped read-only on load, so
+    several worker processes share one copy through the page cache; the
+    first local write copies it into a private buffer.
+    """
+
+    def __init__(self, backend=None, meta_fields=("text", "name", "doc_id")):
+        self._lock = threading.RLock()
+        self._buf = np.zeros((0, 0), dtype=np.float32)
+        self._n = 0
+        self._ids: list[str] = []
+        self._meta: list[dict] = []
+        self.backend = backend or FlatSearch()
+        self.meta_fields = tuple(meta_fields)
+        self.loaded = False
+        self.version = None          # manifest version last saved/loaded
+        self._checked = 0.0
+
+    def __len__(self) -> int:
+        return self._n
+
+    @property
+    def dim(self) -> int:
+        return self._buf.shape[1]
+
+    def _reserve(self, extra: int, dim: int):
+        if self._buf.shape[1] not in (0, dim):
+            raise ValueError(f"Embedding dim {dim} != index dim {self._buf.shape[1]}")
+        need = self._n + extra
+        if need <= self._buf.shape[0] and self._buf.shape[1] == dim:
+            return
+        cap = max(need, 2 * self._buf.shape[0], 64)
+        buf = np.zeros((cap, dim), dtype=np.float32)
+        if self._n:
+            buf[: self._n] = self._buf[: self._n]
+        self._buf = buf
+
+    def ensure_loaded(self, populate):
+        """Run `populate(self)` once, on first use."""
+        if self.loaded:
+            return
+        with self._lock:
+            if not self.loaded:
+                populate(self)
+                self.loaded = True
+
+    def reset(self, rows):
+        with self._lock:
+            self._buf = np.zeros((0, 0), dtype=np.float32)
+            self._n = 0
+            self._ids, self._meta = [], []
+            self.add(rows, refit=False)
+            self.backend.fit(self._buf[: self._n])
+            self.loaded = True
+
+    def add(self, rows, refit: bool = True) -> int:
+        """
+        Append rows shaped like Mongo knowledge docs:
+        `{"_id", "embedding", "text", ...}`; only `meta_fields` are kept
+        alongside the vector. Returns number of rows added.
+        """
+        ids, meta, vecs = [], [], []
+        for row in rows:
+            emb = row.get("embedding")
+            if emb is None or len(emb) == 0:
+                continue
+            ids.append(str(row.get("_id")))
+            meta.append({k: row.get(k) for k in self.meta_fields})
+            vecs.append(normalize(emb))
+        if not vecs:
+            return 0
+        mat = np.vstack(vecs)
+        with self._lock:
+            start = self._n
+            self._reserve(len(vecs), mat.shape[1])
+            self._buf[start: start + len(vecs)] = mat
+            self._n += len(vecs)
+            self._ids.extend(ids)
+            self._meta.extend(meta)
+            if refit:
+                self.backend.added(self._buf[: self._n], start)
+        return len(vecs)
+
+    def remove(self, predicate) -> int:
+        """Drop every row whose metadata satisfies `predicate(meta)`."""
+        with self._lock:
+            keep = np.array([i for i, m in enumerate(self._meta) if not predicate(m)], dtype=np.int64)
+            removed = self._n - len(keep)
+            if removed:
+                if self._buf.flags.writeable:
+                    self._buf[: len(keep)] = self._buf[keep]
+                else:   # memory-mapped snapshot: compact into a private copy
+                    self._buf = self._buf[keep]
+                self._ids = [self._ids[i] for i in keep]
+                self._meta = [self._meta[i] for i in keep]
+                self._n = len(keep)
+                self.backend.compacted(keep)
+            return removed
+
+    def replace(self, predicate, rows) -> int:
+        """remove(predicate) + add(rows) as one step: searches see old or new, never neither."""
+        with self._lock:
+            self.remove(predicate)
+            return self.add(rows)
+
+    def search(self, query, k: int = 6, with_vectors: bool = False) -> list[tuple]:
+        """
+        Top-k rows by cosine similarity → [(score, meta), ...] best first;
+        [(score, meta, unit vector), ...] with `with_vectors`.
+        """
+        with self._lock:
+            n = self._n
+            if n == 0 or k <= 0:
+                return []
+            q = normalize(query)
+            mat = self._buf[:n]
+            rows = self.backend.candidates(mat, q)
+            if rows is None:
+                rows = np.arange(n)
+            if len(rows) == 0:
+                return []
+            scores = mat[rows] @ q
+            k = min(k, len(rows))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            if with_vectors:
+                return [(float(scores[i]), self._meta[rows[i]], mat[rows[i]].copy()) for i in top]
+            return [(float(scores[i]), self._meta[rows[i]]) for i in top]
+
+    def rows(self):
+        """Snapshot of the rows as `{"_id", **meta}` dicts (no vectors)."""
+        with self._lock:
+            return [{"_id": rid, **m} for rid, m in zip(self._ids, self._meta)]
+
+    # ---- persistence ----
+    # `path` is a JSON manifest (ids, metadata, file names) next to a
+    # versioned `<path>.<version>.npy` matrix and backend state .npz; the
+    # manifest is replaced last, so readers always see a complete version.
+    def save(self, path: str):
+        """Atomically write a new on-disk version of the index to `path`."""
+        version = uuid.uuid4().hex[:12]
+        base = os.path.splitext(path)[0]
+        matrix_file = f"{base}.{version}.npy"
+        state_file = f"{base}.{version}.backend.npz"
+        with self._lock:
+            np.save(matrix_file, self._buf[: self._n])
+            bio = io.BytesIO()
+            np.savez(bio, **self.backend.state())
+            manifest = {
+                "version": version,
+                "matrix": os.path.basename(matrix_file),
+                "backend": self.backend.name,
+                "backend_state": os.path.basename(state_file),
+                "ids": self._ids,
+                "meta": self._meta,
+            }
+            self.version = version
+        with open(state_file, "wb") as f:
+            f.write(bio.getvalue())
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(tmp, path)
+        # older versions may still be mapped by other workers; unlinking is safe
+        for old in glob.glob(f"{glob.escape(base)}.*.npy") + glob.glob(f"{glob.escape(base)}.*.backend.npz"):
+            if version not in os.path.basename(old):
+                try:
+                    os.unlink(old)
+                except OSError:
+                    pass
+
+    def load_file(self, path: str, mmap: bool = True) -> bool:
+        """Restore from `save()` output (matrix memory-mapped); False if missing/unreadable."""
+        if not path or not os.path.exists(path):
+            return False
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            folder = os.path.dirname(path)
+            mat = np.load(os.path.join(folder, manifest["matrix"]), mmap_mode="r" if mmap else None)
+            if mat.dtype != np.float32:
+                mat = mat.astype(np.float32)
+            with np.load(os.path.join(folder, manifest["backend_state"]), allow_pickle=False) as z:
+                state = {k: z[k] for k in z.files}
+            ids, meta = manifest["ids"], manifest["meta"]
+            same_backend = manifest["backend"] == self.backend.name
+        except Exception as e:
+            print("Vector index load failed:", e)
+            return False
+        with self._lock:
+            self._buf = mat
+            self._n = len(mat)
+            self._ids, self._meta = ids, meta
+            if same_backend and state:
+                self.backend.restore(state)
+            else:
+                self.backend.fit(self._buf[: self._n])
+            self.version = manifest["version"]
+            self.loaded = True
+        return True
+
+    def refresh(self, path: str, min_interval: float = 2.0) -> bool:
+        """
+        Reload from `path` if another process saved a newer version since
+        our last save/load; checked at most every `min_interval` seconds.
+        Returns True if the index was reloaded.
+        """
+        now = time.monotonic()
+        if not self.loaded or now - self._checked < min_interval:
+            return False
+        self._checked = now
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                head = f.read(64)
+        except OSError:
+            return False
+        if self.version and f'"version": "{self.version}"' in head:
+            return False
+        return self.load_file(path)
@@ -0,0 +1,101 @@
+import os
+import sys
+
+import pytest
+
+# backend modules import each other as top-level `utils.*`, as server.py does
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+
+class WordCounter:
+    """TokenCounter stand-in with one token per word, so budgets are exact and no tiktoken download is needed."""
+
+    def count(self, text):
+        return len(text.split())
+
+    def split(self, text, max_tokens):
+        words = text.split()
+        return [" ".join(words[i:i + max_tokens]) for i in range(0, len(words), max_tokens)]
+
+
+@pytest.fixture
+def counter():
+    return WordCounter()
+
+
+@pytest.fixture
+def replay_bulk_writes(monkeypatch):
+    """
+    mongomock's bulk_write rejects current pymongo UpdateOne objects; call
+    this on a collection to have them applied one update_one at a time.
+    """
+    def patch(coll):
+        monkeypatch.setattr(coll, "bulk_write", lambda ops, ordered=True: [
+            coll.update_one(op._filter, op._doc, upsert=bool(op._upsert)) for op in ops])
+    return patch
+
+
+@pytest.fixture(scope="session")
+def server(tmp_path_factory):
+    """
+    backend/server.py imported against an in-memory Mongo (mongomock), with
+    its uploads/ and knowledge index under a temp dir. Nothing is started:
+    no Mongo connection, no Telegram senders, no OpenAI calls unless a test
+    patches them in.
+    """
+    mongomock = pytest.importorskip("mongomock")
+    pytest.importorskip("flask")
+    import pymongo
+
+    root = tmp_path_factory.mktemp("server")
+    saved_env = dict(os.environ)
+    saved_cwd = os.getcwd()
+    saved_client = pymongo.MongoClient
+    os.environ.update({"MONGODB_URI": "mongodb://127.0.0.1:1", "OPENAI_API_KEY": "test",
+                       "KNOWLEDGE_INDEX_DIR": str(root / "knowledge_index")})
+    os.chdir(root)
+    pymongo.MongoClient = mongomock.MongoClient
+    try:
+        import server
+    finally:
+        pymongo.MongoClient = saved_client
+    yield server
+    os.chdir(saved_cwd)
+    os.environ.clear()
+    os.environ.update(saved_env)
+
+
+@pytest.fixture
+def admin(server):
+    """Flask test client with a logged-in dashboard session."""
+    client = server.app.test_client()
+    with client.session_transaction() as sess:
+        sess["user"] = "admin"
+    return client
+
+
+@pytest.fixture
+def applications(server):
+    """
+    Five applications, one per day from 2025-03-01, newest last:
+    [(id, doc)] with status/country/telegram_id varied for filter tests.
+    """
+    from datetime import datetime, timedelta
+
+    from bson import ObjectId
+
+    coll = server.applications_collection
+    coll.delete_many({})
+    seeded = []
+    for i, (status, country, tg) in enumerate([
+        ("pending", "Serbia", None), ("approved", "Brazil", 11), ("pending", "Brazil", 12),
+        ("rejected", "Serbia", None), ("pending", "Serbia", 13),
+    ]):
+        _id = ObjectId.from_datetime(datetime(2025, 3, 1, 12) + timedelta(days=i))
+        doc = {"_id": _id, "name": f"Applicant {i}", "email": f"a{i}@example.com", "status": status,
+               "country": country, "photos": [f"https://img/{i}/1.jpg", f"https://img/{i}/2.jpg"]}
+        if tg is not None:
+            doc["telegram_id"] = tg
+        coll.insert_one(doc)
+        seeded.append((str(_id), doc))
+    return seeded
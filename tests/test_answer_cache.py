@@ -0,0 +1,72 @@
+import pytest
+
+from utils import answer_cache as answer_cache_module
+from utils.answer_cache import SemanticAnswerCache
+
+
+def test_close_question_in_same_language_hits():
+    cache = SemanticAnswerCache(threshold=0.9)
+    cache.store("English", "how much is the pay?", [1.0, 0.0, 0.1], "500 USD")
+    answer, sim = cache.lookup("English", [0.98, 0.0, 0.12])
+    assert answer == "500 USD" and sim >= 0.9
+    assert cache.lookup("Spanish", [1.0, 0.0, 0.1]) is None
+    assert cache.lookup("English", [0.0, 1.0, 0.0]) is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+
+
+def test_entries_expire_and_oldest_are_evicted(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(answer_cache_module.time, "monotonic", lambda: now[0])
+    cache = SemanticAnswerCache(threshold=0.99, ttl=10, max_items=2)
+    cache.store("English", "a", [1.0, 0.0], "A")
+    cache.store("English", "b", [0.0, 1.0], "B")
+    cache.store("English", "c", [1.0, 1.0], "C")   # evicts a
+    assert cache.lookup("English", [1.0, 0.0]) is None
+    assert cache.lookup("English", [0.0, 1.0])[0] == "B"
+    now[0] += 11
+    assert cache.lookup("English", [0.0, 1.0]) is None
+    assert cache.stats()["items"] == {"English": 0}
+
+
+def test_embedding_dimension_change_starts_over():
+    cache = SemanticAnswerCache()
+    cache.store("English", "q", [1.0, 0.0], "old")
+    cache.store("English", "q", [1.0, 0.0, 0.0], "new")
+    assert cache.lookup("English", [1.0, 0.0]) is None
+    assert cache.lookup("English", [1.0, 0.0, 0.0])[0] == "new"
+
+
+@pytest.fixture
+def qa(server, monkeypatch):
+    completions = []
+
+    def complete(messages, temperature, on_delta=None):
+        completions.append(messages[-1]["content"])
+        return f"answer {len(completions)}"
+
+    monkeypatch.setattr(server, "answer_cache", SemanticAnswerCache(threshold=0.9))
+    monkeypatch.setattr(server, "refresh_knowledge", lambda: None)
+    monkeypatch.setattr(server, "embed_query", lambda q: [1.0, 0.0] if "pay" in q else [0.0, 1.0])
+    monkeypatch.setattr(server, "build_context_for_question", lambda q, query_vec=None: "ctx")
+    monkeypatch.setattr(server, "chat_completion", complete)
+    monkeypatch.setattr(server, "_warm_intro_context", lambda: None)
+    return completions
+
+
+def test_paraphrase_reuses_answer_until_knowledge_changes(server, qa):
+    assert server.answer_question("English", "what's the pay?") == "answer 1"
+    assert server.answer_question("English", "how much pay?") == "answer 1"
+    assert len(qa) == 1
+    server._on_knowledge_changed()
+    assert server.answer_question("English", "how much pay?") == "answer 2"
+
+
+def test_answer_generated_across_a_knowledge_change_is_not_cached(server, qa, monkeypatch):
+    def complete_while_reindexed(messages, temperature, on_delta=None):
+        server._on_knowledge_changed()
+        qa.append(messages)
+        return "stale"
+
+    monkeypatch.setattr(server, "chat_completion", complete_while_reindexed)
+    server.answer_question("English", "pay?")
+    assert server.answer_cache.lookup("English", [1.0, 0.0]) is None
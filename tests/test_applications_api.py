@@ -0,0 +1,49 @@
+def fetch_all(client, **params):
+    items, pages, cursor = [], 0, None
+    while True:
+        query = {**params, **({"cursor": cursor} if cursor else {})}
+        body = client.get("/api/applications", query_string=query).get_json()
+        items += body["items"]
+        pages += 1
+        cursor = body["next_cursor"]
+        if not cursor:
+            return items, pages
+
+
+def names(items):
+    return [item["name"] for item in items]
+
+
+def test_cursor_pages_cover_every_row_once_newest_first(admin, applications):
+    items, pages = fetch_all(admin, limit=2)
+    assert names(items) == [f"Applicant {i}" for i in (4, 3, 2, 1, 0)]
+    assert pages == 3
+    assert items[0]["id"] == applications[4][0]
+
+
+def test_ascending_sort_and_exact_final_page(admin, applications):
+    items, pages = fetch_all(admin, limit=5, sort="asc")
+    assert names(items) == [f"Applicant {i}" for i in range(5)]
+    assert pages == 1
+
+
+def test_filters_combine(admin, applications):
+    assert names(fetch_all(admin, status="pending", country="Serbia")[0]) == ["Applicant 4", "Applicant 0"]
+    assert names(fetch_all(admin, has_telegram="true")[0]) == ["Applicant 4", "Applicant 2", "Applicant 1"]
+    assert names(fetch_all(admin, has_telegram="false")[0]) == ["Applicant 3", "Applicant 0"]
+    # a bare date_to includes that whole day
+    assert names(fetch_all(admin, date_from="2025-03-02", date_to="2025-03-03")[0]) == ["Applicant 2", "Applicant 1"]
+
+
+def test_listing_returns_only_table_fields_and_a_flag(admin, applications, server):
+    server.applications_collection.update_one({"name": "Applicant 0"}, {"$set": {"ip": "10.0.0.1"}})
+    item = fetch_all(admin, limit=1, sort="asc")[0][0]
+    assert "ip" not in item and "_id" not in item
+    assert item["country_flag"]
+
+
+def test_bad_arguments_are_rejected(admin, applications, server):
+    assert admin.get("/api/applications?cursor=nope").status_code == 400
+    assert admin.get("/api/applications?date_from=yesterday").status_code == 400
+    assert admin.get("/api/applications?limit=x").status_code == 400
+    assert server.app.test_client().get("/api/applications").status_code == 401
@@ -0,0 +1,38 @@
+import csv
+import io
+import json
+
+
+def test_csv_export_streams_header_and_filtered_rows(admin, applications):
+    resp = admin.get("/api/applications/export?status=pending", buffered=False)
+    assert resp.status_code == 200
+    assert resp.mimetype == "text/csv"
+    assert resp.is_streamed
+    assert "attachment; filename=applications-" in resp.headers["Content-Disposition"]
+    rows = list(csv.DictReader(io.StringIO(resp.get_data(as_text=True))))
+    assert [r["name"] for r in rows] == ["Applicant 0", "Applicant 2", "Applicant 4"]   # oldest first
+    assert rows[0]["created_at"].startswith("2025-03-01T12:00:00")
+    assert rows[0]["photos"] == "https://img/0/1.jpg https://img/0/2.jpg"
+    assert rows[0]["telegram_id"] == "" and rows[1]["telegram_id"] == "12"
+
+
+def test_ndjson_export_is_one_record_per_line(admin, applications):
+    resp = admin.get("/api/applications/export?format=ndjson&country=Brazil")
+    assert resp.mimetype == "application/x-ndjson"
+    records = [json.loads(line) for line in resp.get_data(as_text=True).splitlines()]
+    assert [r["email"] for r in records] == ["a1@example.com", "a2@example.com"]
+    assert "_id" not in records[0] and records[0]["photos"] == ["https://img/1/1.jpg", "https://img/1/2.jpg"]
+
+
+def test_csv_is_sent_row_by_row(admin, applications):
+    resp = admin.get("/api/applications/export", buffered=False)
+    chunks = [c.decode() if isinstance(c, bytes) else c for c in resp.response]
+    resp.close()
+    assert chunks[0].startswith("created_at,name,") and chunks[0].count("\n") == 1
+    assert len(chunks) == 1 + len(applications)
+
+
+def test_export_rejects_bad_arguments(admin, applications, server):
+    assert admin.get("/api/applications/export?format=xlsx").status_code == 400
+    assert admin.get("/api/applications/export?date_to=soon").status_code == 400
+    assert server.app.test_client().get("/api/applications/export").status_code == 401
@@ -0,0 +1,97 @@
+import json
+import textwrap
+
+from utils.chunker import iter_char_chunks, iter_token_chunks, normalize_ws
+
+
+def chunks(counter, texts, max_tokens=50, overlap=0):
+    return list(iter_token_chunks(texts, max_tokens=max_tokens, overlap=overlap, counter=counter))
+
+
+def sentences(n, words=9, tag="s"):
+    return " ".join(f"{tag}{i} " + " ".join(["word"] * (words - 2)) + "." for i in range(n))
+
+
+def test_small_text_is_one_chunk(counter):
+    assert chunks(counter, ["Hello there. How are you?"]) == ["Hello there. How are you?"]
+
+
+def test_empty_input_yields_nothing(counter):
+    assert chunks(counter, ["", "   \n\n "]) == []
+
+
+def test_chunks_stay_within_budget(counter):
+    text = "\n\n".join(sentences(6, tag=f"p{p}-") for p in range(10))
+    out = chunks(counter, [text], max_tokens=40, overlap=8)
+    assert len(out) > 1
+    assert all(counter.count(c) <= 40 for c in out)
+
+
+def test_oversized_unit_is_hard_split(counter):
+    out = chunks(counter, [" ".join(f"w{i}" for i in range(130))], max_tokens=50)
+    assert all(counter.count(c) <= 50 for c in out)
+    assert " ".join(out).split() == [f"w{i}" for i in range(130)]
+
+
+def test_paragraphs_are_not_cut_when_they_fit(counter):
+    paras = [sentences(2, tag=f"p{i}-") for i in range(6)]   # 18 words each
+    out = chunks(counter, ["\n\n".join(paras)], max_tokens=40)
+    for p in paras:
+        assert any(p in c for c in out)
+
+
+def test_overlap_carries_trailing_sentences(counter):
+    out = chunks(counter, [sentences(20, words=5)], max_tokens=30, overlap=10)
+    assert len(out) > 1
+    for prev, nxt in zip(out, out[1:]):
+        # the next chunk opens with whole trailing sentences of the previous one
+        first = nxt.split(". ")[0] + "."
+        carried = prev[prev.index(first):]
+        assert nxt.startswith(carried)
+        assert 0 < counter.count(carried) <= 10
+
+
+def test_heading_starts_a_new_chunk(counter):
+    body = sentences(3, words=10)                            # 30 words
+    text = f"{body}\n\nPayment terms\n\n{sentences(1, words=6, tag='pay')}"
+    out = chunks(counter, [text], max_tokens=50)
+    assert out[-1].startswith("Payment terms\n\npay0")
+
+
+def test_markdown_heading_needs_no_blank_line(counter):
+    out = chunks(counter, [f"{sentences(4, words=10)}\n\n# Payment\n{sentences(1, words=6)}"], max_tokens=50)
+    assert out[-1].startswith("# Payment\n\ns0")
+
+
+def test_hard_wrapped_lines_are_one_paragraph(counter):
+    paras = [sentences(8, words=12, tag=f"p{i}-") for i in range(12)]
+    plain = chunks(counter, ["\n\n".join(paras)], max_tokens=200, overlap=20)
+    wrapped = chunks(counter, ["\n\n".join(textwrap.fill(p, 70) for p in paras)], max_tokens=200, overlap=20)
+    assert wrapped == plain
+    assert sum(c.count("\n\n") for c in wrapped) == sum(c.count("\n\n") for c in plain)
+
+
+def test_hyphenated_line_break_is_joined(counter):
+    assert chunks(counter, ["A well-\nknown rule applies\nto every shift."]) == ["A well-known rule applies to every shift."]
+
+
+def test_overlap_between_whole_paragraphs(counter):
+    # each paragraph (40 words) fits whole but is bigger than the overlap
+    paras = [sentences(4, words=10, tag=f"p{i}-") for i in range(6)]
+    out = chunks(counter, ["\n\n".join(paras)], max_tokens=90, overlap=25)
+    assert len(out) > 2
+    for prev, nxt in zip(out, out[1:]):
+        first = nxt.split(". ")[0] + "."
+        assert first in prev and prev.endswith(nxt[:len(prev) - prev.index(first)])
+        assert 0 < counter.count(prev[prev.index(first):]) <= 25
+
+
+def test_json_records_stay_whole(counter):
+    records = [json.dumps({"q": f"question {i}", "a": "answer " * 5}) for i in range(10)]
+    out = chunks(counter, records, max_tokens=40)
+    for r in records:
+        assert any(normalize_ws(r) in c for c in out)
+
+
+def test_char_chunker_respects_window():
+    assert all(len(c) <= 100 * 4 for c in iter_char_chunks([sentences(200)], max_tokens=100))
@@ -0,0 +1,47 @@
+import numpy as np
+
+from utils.context_packer import PackStats, pack_context
+
+
+def hit(score, text, vec):
+    return score, {"text": text}, None if vec is None else np.asarray(vec, dtype=np.float32)
+
+
+def test_drops_hits_below_min_score(counter):
+    text, info = pack_context([hit(0.9, "good chunk", [1, 0]), hit(0.1, "weak chunk", [0, 1])],
+                              counter, min_score=0.25)
+    assert text == "good chunk"
+    assert info["below_threshold"] == 1
+
+
+def test_skips_near_duplicates(counter):
+    hits = [hit(0.9, "a b c", [1, 0, 0]), hit(0.89, "a b c d", [1, 0.01, 0]), hit(0.5, "other", [0, 1, 0])]
+    text, info = pack_context(hits, counter, min_score=0.0)
+    assert text == "a b c\n\nother"
+    assert info["duplicates"] == 1
+
+
+def test_respects_token_budget(counter):
+    hits = [hit(0.9 - i / 100, " ".join(["w"] * 40), [np.cos(i), np.sin(i)]) for i in range(5)]
+    text, info = pack_context(hits, counter, budget_tokens=100, min_score=0.0, dup_threshold=1.1)
+    assert info["tokens"] <= 100 and info["chunks"] == 2
+
+
+def test_first_chunk_larger_than_budget_is_truncated(counter):
+    text, info = pack_context([hit(0.9, " ".join(["w"] * 50), [1, 0])], counter, budget_tokens=10)
+    assert info["tokens"] == 10 and len(text.split()) == 10
+
+
+def test_lexical_hits_without_vectors(counter):
+    hits = [hit(0.8, "from bm25", None), hit(0.7, "from bm25", None), hit(0.6, "vector", [1, 0])]
+    text, info = pack_context(hits, counter, min_score=0.0)
+    assert text == "from bm25\n\nvector"
+    assert info["duplicates"] == 1
+
+
+def test_pack_stats_averages():
+    stats = PackStats()
+    stats.record({"candidates": 4, "chunks": 2, "tokens": 100})
+    stats.record({"candidates": 2, "chunks": 0, "tokens": 0})
+    s = stats.stats()
+    assert s["calls"] == 2 and s["avg_tokens"] == 50.0 and s["last"]["candidates"] == 2
@@ -0,0 +1,64 @@
+import pytest
+
+from utils.embedding_cache import EmbeddingCache, cache_key
+
+mongomock = pytest.importorskip("mongomock")
+
+
+@pytest.fixture
+def store(replay_bulk_writes):
+    coll = mongomock.MongoClient().db.embedding_cache
+    replay_bulk_writes(coll)
+    return coll
+
+
+def test_cache_key_normalizes_whitespace_and_separates_models():
+    assert cache_key("m", "hello  world\n") == cache_key("m", " hello world")
+    assert cache_key("m", "hello") != cache_key("other", "hello")
+
+
+def test_memory_tier_is_a_bounded_lru():
+    cache = EmbeddingCache(max_items=2)
+    cache.put_many("m", {"a": [1.0], "b": [2.0]})
+    assert cache.get_many(["a"]) == {"a": [1.0]}   # a is now most recent
+    cache.put_many("m", {"c": [3.0]})               # evicts b
+    assert cache.get_many(["a", "b", "c"]) == {"a": [1.0], "c": [3.0]}
+    stats = cache.stats()
+    assert (stats["memory_items"], stats["memory_hits"], stats["misses"]) == (2, 3, 1)
+
+
+def test_store_tier_serves_other_processes_and_refreshes_last_used(store):
+    EmbeddingCache(store).put_many("m", {"k": [0.5, 0.25]})
+    before = store.find_one({"_id": "k"})["last_used"]
+
+    other = EmbeddingCache(store)   # fresh process: empty memory tier
+    assert other.get_many(["k", "missing"]) == {"k": [0.5, 0.25]}
+    assert store.find_one({"_id": "k"})["last_used"] >= before
+    assert other.get_many(["k"]) == {"k": [0.5, 0.25]}
+    stats = other.stats()
+    assert (stats["store_hits"], stats["memory_hits"], stats["misses"]) == (1, 1, 1)
+    assert any(ix.get("expireAfterSeconds") for ix in store.index_information().values())
+
+
+def test_store_errors_degrade_to_misses():
+    class Down:
+        def find(self, *a, **kw):
+            raise RuntimeError("mongo down")
+
+    cache = EmbeddingCache(Down())
+    assert cache.get_many(["k"]) == {}
+    assert cache.stats()["misses"] == 1
+
+
+def test_get_embeddings_sends_only_unseen_texts_to_the_api(server, monkeypatch):
+    calls = []
+
+    def api(texts):
+        calls.append(list(texts))
+        return [[float(len(t))] for t in texts]
+
+    monkeypatch.setattr(server, "_embed_uncached", api)
+    monkeypatch.setattr(server, "embedding_cache", EmbeddingCache())
+    assert server.get_embeddings(["aa", "b", "aa"]) == [[2.0], [1.0], [2.0]]
+    assert server.get_embeddings(["b", "ccc"]) == [[1.0], [3.0]]
+    assert calls == [["aa", "b"], ["ccc"]]
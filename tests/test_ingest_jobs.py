@@ -0,0 +1,37 @@
+import threading
+import time
+
+
+def poll(client, job_id, stage, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        body = client.get(f"/knowledge/jobs/{job_id}").get_json()
+        if body.get("stage") == stage:
+            return body
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} never reached {stage!r}")
+
+
+def test_job_progress_is_visible_to_other_workers(server, monkeypatch):
+    release = threading.Event()
+
+    def work(job):
+        server._job_incr(job, "pages", 3)
+        server._job_update(job, stage="embedding")
+        release.wait(10)
+        return 5
+
+    job = server.start_ingest_job(name="faq.jsonl", kind="jsonl", size=10, work=work)
+    # another worker process: same Mongo, none of this process's job records
+    monkeypatch.setattr(server, "INGEST_JOBS", {})
+    client = server.app.test_client()
+
+    running = poll(client, job["id"], "embedding")
+    assert running["name"] == "faq.jsonl" and running["pages"] == 3
+    release.set()
+    done = poll(client, job["id"], "done")
+    assert done["chunks"] == 5 and done["elapsed_s"] >= 0
+
+
+def test_unknown_job_is_404(server):
+    assert server.app.test_client().get("/knowledge/jobs/nope").status_code == 404
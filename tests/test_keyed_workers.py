@@ -0,0 +1,55 @@
+import threading
+import time
+
+from utils.keyed_workers import KeyedWorkerPool
+
+
+def wait_idle(pool, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        m = pool.metrics()
+        if m["processed"] == m["submitted"]:
+            return m
+        time.sleep(0.01)
+    raise AssertionError("pool did not drain")
+
+
+def test_jobs_of_one_key_run_in_order_one_at_a_time():
+    pool = KeyedWorkerPool(4)
+    seen, running = [], []
+
+    def job(i):
+        running.append(i)
+        assert len(running) == 1
+        time.sleep(0.005)
+        seen.append(i)
+        running.remove(i)
+
+    for i in range(20):
+        pool.submit("chat", job, i)
+    assert wait_idle(pool)["errors"] == 0
+    assert seen == list(range(20))
+
+
+def test_slow_key_does_not_block_other_keys():
+    pool = KeyedWorkerPool(2)
+    release = threading.Event()
+    done = []
+    pool.submit("slow", release.wait, 5)
+    for key in range(10):
+        pool.submit(key, done.append, key)
+    deadline = time.monotonic() + 2
+    while len(done) < 10 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert sorted(done) == list(range(10))
+    release.set()
+    wait_idle(pool)
+
+
+def test_errors_are_counted_and_the_key_keeps_going():
+    pool = KeyedWorkerPool(1)
+    out = []
+    pool.submit("k", lambda: 1 / 0)
+    pool.submit("k", out.append, "after")
+    m = wait_idle(pool)
+    assert m["errors"] == 1 and out == ["after"] and m["queue_depth"] == 0
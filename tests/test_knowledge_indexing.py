@@ -0,0 +1,88 @@
+import fcntl
+
+import pytest
+
+
+@pytest.fixture
+def embedded(server, monkeypatch, replay_bulk_writes):
+    calls = []
+
+    def fake_embeddings(texts):
+        calls.extend(texts)
+        return [[float(len(t)), 1.0, float(sum(map(ord, t)) % 7)] for t in texts]
+
+    monkeypatch.setattr(server, "get_embeddings", fake_embeddings)
+    monkeypatch.setattr(server, "_warm_intro_context", lambda: None)
+    replay_bulk_writes(server.knowledge_collection)
+    # one chunk per paragraph, so which chunks change is obvious
+    monkeypatch.setattr(server, "iter_chunks", lambda texts: (p for t in texts for p in t.split("\n\n") if p))
+    server.knowledge_collection.delete_many({})
+    server.knowledge_docs_coll.delete_many({})
+    return calls
+
+
+def index(server, doc_id, text):
+    return server.index_into_vector_store(doc_id=doc_id, name=f"{doc_id}.txt", kind="txt", text=text)
+
+
+def stored(server, doc_id):
+    return list(server.knowledge_collection.find({"doc_id": doc_id}).sort("chunk_index", 1))
+
+
+def test_reindex_embeds_only_new_chunks_and_swaps_generation(server, embedded):
+    assert index(server, "doc-a", "alpha\n\nbeta\n\ngamma") == 3
+    before = {r["text"]: r["_id"] for r in stored(server, "doc-a")}
+    embedded.clear()
+
+    assert index(server, "doc-a", "alpha\n\ngamma\n\ndelta") == 3
+    assert embedded == ["delta"]
+    rows = stored(server, "doc-a")
+    assert [r["text"] for r in rows] == ["alpha", "gamma", "delta"]
+    assert [r["_id"] for r in rows[:2]] == [before["alpha"], before["gamma"]]
+    generation = server.knowledge_docs_coll.find_one({"_id": "doc-a"})["generation"]
+    assert {r["generation"] for r in rows} == {generation}
+    resident = [m["text"] for m in server.knowledge_index.rows() if m.get("doc_id") == "doc-a"]
+    assert resident == ["alpha", "gamma", "delta"]
+
+
+def test_failed_reindex_keeps_previous_version(server, embedded, monkeypatch):
+    index(server, "doc-b", "one\n\ntwo")
+    generation = server.knowledge_docs_coll.find_one({"_id": "doc-b"})["generation"]
+
+    def down(texts):
+        raise RuntimeError("embeddings API down")
+
+    monkeypatch.setattr(server, "get_embeddings", down)
+    with pytest.raises(RuntimeError):
+        index(server, "doc-b", "one\n\nthree")
+    assert [r["text"] for r in stored(server, "doc-b")] == ["one", "two"]
+    assert {r["generation"] for r in stored(server, "doc-b")} == {generation}
+
+
+def test_generation_swap_runs_under_the_index_file_lock(server, embedded, monkeypatch):
+    index(server, "doc-c", "keep\n\nold")
+    bulk_write = server.knowledge_collection.bulk_write
+    held = []
+
+    def probing_bulk_write(*args, **kwargs):
+        with open(f"{server.KNOWLEDGE_INDEX_PATH}.lock", "a") as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                fcntl.flock(f, fcntl.LOCK_UN)
+                held.append(False)
+            except BlockingIOError:
+                held.append(True)
+        return bulk_write(*args, **kwargs)
+
+    monkeypatch.setattr(server.knowledge_collection, "bulk_write", probing_bulk_write)
+    index(server, "doc-c", "keep\n\nnew")
+    assert held == [True]
+
+
+def test_delete_removes_rows_metadata_and_resident_copy(server, embedded):
+    index(server, "doc-d", "gone soon")
+    assert server.delete_knowledge_doc("doc-d")
+    assert stored(server, "doc-d") == []
+    assert server.knowledge_docs_coll.find_one({"_id": "doc-d"}) is None
+    assert not [m for m in server.knowledge_index.rows() if m.get("doc_id") == "doc-d"]
+    assert not server.delete_knowledge_doc("doc-d")
@@ -0,0 +1,46 @@
+import io
+import os
+import time
+
+import pytest
+
+
+@pytest.fixture
+def client(server, admin, monkeypatch):
+    monkeypatch.setattr(server, "get_embeddings", lambda texts: [[float(len(t)), 1.0, 0.0] for t in texts])
+    monkeypatch.setattr(server, "_warm_intro_context", lambda: None)
+    return admin
+
+
+def uploads(server):
+    return sorted(os.listdir(server.UPLOAD_FOLDER))
+
+
+def wait_for(server, job_id, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = server.INGEST_JOBS[job_id]
+        if job["finished_at"]:
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def test_unsupported_type_is_rejected_before_anything_is_written(server, client):
+    before = uploads(server)
+    resp = client.post("/knowledge/upload", data={"file": (io.BytesIO(b"hello"), "notes.txt")},
+                       content_type="multipart/form-data")
+    assert resp.status_code == 400
+    assert uploads(server) == before
+
+
+def test_upload_is_indexed_from_a_private_temp_file_that_is_removed(server, client):
+    before = uploads(server)
+    body = b'{"q": "pay?", "a": "weekly"}\n{"q": "hours?", "a": "flexible"}\n'
+    resp = client.post("/knowledge/upload", data={"file": (io.BytesIO(body), "faq.jsonl")},
+                       content_type="multipart/form-data")
+    assert resp.status_code == 202
+    job = wait_for(server, resp.get_json()["job_id"])
+    assert job["stage"] == "done", job["error"]
+    assert job["chunks"] >= 1
+    assert uploads(server) == before
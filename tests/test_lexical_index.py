@@ -0,0 +1,58 @@
+from utils.lexical_index import BM25Index, reciprocal_rank_fusion, tokenize
+
+DOCS = [
+    {"_id": 1, "text": "The weekly pay is 500 USD, paid every Friday.", "doc_id": "faq"},
+    {"_id": 2, "text": "Shifts are four hours long and can be booked in the app.", "doc_id": "faq"},
+    {"_id": 3, "text": "Contact support@example.com for payment questions.", "doc_id": "help"},
+]
+
+
+def index():
+    bm25 = BM25Index()
+    bm25.reset(DOCS)
+    return bm25
+
+
+def test_tokenize_keeps_emails_and_numbers():
+    assert tokenize("Mail support@example.com about 1,500.00 now") == [
+        "mail", "support@example.com", "about", "1,500.00", "now"]
+
+
+def test_search_ranks_matching_row_first():
+    hits = index().search("how much is the weekly pay?", k=3)
+    assert hits[0][1]["text"].startswith("The weekly pay")
+
+
+def test_stopword_only_query_matches_nothing():
+    assert index().search("what is the", k=3) == []
+
+
+def test_min_score_drops_weak_matches():
+    bm25 = index()
+    hits = bm25.search("pay shifts", k=3)
+    assert len(hits) == 2
+    assert bm25.search("pay shifts", k=3, min_score=hits[0][0] + 1) == []
+
+
+def test_replace_and_remove():
+    bm25 = index()
+    bm25.replace(lambda m: m["doc_id"] == "faq", [{"_id": 4, "text": "Pay is 600 USD now.", "doc_id": "faq"}])
+    assert len(bm25) == 2
+    assert bm25.search("shifts", k=3) == []
+    assert bm25.search("pay", k=1)[0][1]["text"] == "Pay is 600 USD now."
+    assert bm25.remove(lambda m: m["doc_id"] == "help") == 1
+    assert bm25.search("support@example.com", k=3) == []
+
+
+def test_rrf_rewards_agreement():
+    a = [(0.9, {"id": "x"}), (0.8, {"id": "y"})]
+    b = [(12.0, {"id": "y"}), (3.0, {"id": "z"})]
+    fused = reciprocal_rank_fusion([a, b], key=lambda h: h[1]["id"], k=60)
+    assert [m["id"] for _, m in fused] == ["y", "x", "z"]
+    assert fused[0][0] == 1 / 62 + 1 / 61
+
+
+def test_rrf_keeps_first_lists_extra_fields():
+    a = [(0.9, {"id": "x"}, "vec")]
+    b = [(5.0, {"id": "x"}, None)]
+    assert reciprocal_rank_fusion([a, b], key=lambda h: h[1]["id"])[0][2] == "vec"
@@ -0,0 +1,64 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+for module in ("flask", "flask_cors", "dotenv", "openai", "cloudinary", "bcrypt", "pycountry", "pypdf", "PIL"):
+    pytest.importorskip(module)
+
+BACKEND = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend")
+BACKGROUND = ("tg-sender", "tg-restore", "mongo-indexes", "knowledge-docs", "webhook-", "pymongo")
+
+
+def run(tmp_path, script):
+    path = tmp_path / "probe.py"
+    path.write_text(textwrap.dedent(script))
+    env = {**os.environ, "MONGODB_URI": "mongodb://127.0.0.1:1", "OPENAI_API_KEY": "test", "PYTHONPATH": BACKEND}
+    out = subprocess.run([sys.executable, str(path)], cwd=tmp_path, env=env,
+                         capture_output=True, text=True, timeout=120)
+    assert out.returncode == 0, out.stderr
+    return out.stdout.strip().splitlines()[-1].split(",")
+
+
+def test_import_starts_no_background_threads(tmp_path):
+    threads = run(tmp_path, """
+        import threading, time
+        import server
+        time.sleep(0.5)
+        print(",".join(t.name for t in threading.enumerate()))
+    """)
+    assert not [t for t in threads if t.startswith(BACKGROUND)]
+
+
+def test_rerun_as_pool_worker_main_starts_nothing(tmp_path):
+    # what a forkserver/spawn worker does with the entry script
+    threads = run(tmp_path, f"""
+        import runpy, threading, time
+        runpy.run_path({os.path.join(BACKEND, "server.py")!r}, run_name="__mp_main__")
+        time.sleep(0.5)
+        print(",".join(t.name for t in threading.enumerate()))
+    """)
+    assert not [t for t in threads if t.startswith(BACKGROUND)]
+
+
+WORKER_PROBE = """
+    import threading
+    import server
+
+    def thread_names():
+        return [t.name for t in threading.enumerate()]
+
+    if __name__ == "__main__":
+        server.start_background_services()
+        print(",".join(server.{pool}.submit(thread_names).result(timeout=60)))
+"""
+
+
+def test_photo_worker_has_no_senders(tmp_path):
+    assert run(tmp_path, WORKER_PROBE.format(pool="photo_pool")) == ["MainThread"]
+
+
+def test_pdf_worker_has_no_senders(tmp_path):
+    assert run(tmp_path, WORKER_PROBE.format(pool="pdf_pool")) == ["MainThread"]
@@ -0,0 +1,64 @@
+import mongomock
+import pytest
+
+from utils.session_cache import SessionCache, SessionConflict
+
+
+@pytest.fixture
+def coll():
+    c = mongomock.MongoClient().db.sessions
+    c.create_index("chat_id", unique=True)
+    return c
+
+
+def test_local_mode_writes_through(coll):
+    cache = SessionCache(coll)
+    cache.set(1, state="awaiting_email", language="Spanish")
+    assert coll.find_one({"chat_id": 1})["state"] == "awaiting_email"
+    cache.set(1, state="job_intro")
+    doc = cache.get(1)
+    assert doc["state"] == "job_intro" and doc["language"] == "Spanish" and doc["version"] == 2
+
+
+def test_get_returns_a_copy(coll):
+    cache = SessionCache(coll)
+    cache.set(1, state="a")
+    cache.get(1)["state"] = "mutated"
+    assert cache.get(1)["state"] == "a"
+
+
+def test_cache_is_bounded(coll):
+    cache = SessionCache(coll, max_items=2)
+    for chat in range(3):
+        cache.set(chat, state="x")
+    assert cache.stats()["items"] == 2
+
+
+def test_cas_reads_are_revalidated(coll):
+    a, b = SessionCache(coll, mode="cas"), SessionCache(coll, mode="cas")
+    a.set(1, state="awaiting_language")
+    assert b.get(1)["state"] == "awaiting_language"
+    a.get(1)
+    a.set(1, state="awaiting_email")
+    assert b.get(1)["state"] == "awaiting_email"
+    assert b.stats()["stale"] == 1
+
+
+def test_cas_conflict_is_raised_not_reapplied(coll):
+    a, b = SessionCache(coll, mode="cas"), SessionCache(coll, mode="cas")
+    a.set(1, state="awaiting_email")
+    a.get(1)
+    b.get(1)
+    a.set(1, state="job_intro")
+    with pytest.raises(SessionConflict):
+        b.set(1, state="awaiting_platform")
+    assert coll.find_one({"chat_id": 1})["state"] == "job_intro"
+    # after re-reading, the transition goes through
+    assert b.get(1)["state"] == "job_intro"
+    b.set(1, state="awaiting_platform")
+    assert coll.find_one({"chat_id": 1})["version"] == 3
+
+
+def test_unknown_mode(coll):
+    with pytest.raises(ValueError):
+        SessionCache(coll, mode="redis")
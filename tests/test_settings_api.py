@@ -0,0 +1,58 @@
+import pytest
+
+
+@pytest.fixture
+def settings(server):
+    server.settings_collection.delete_many({})
+    server.invalidate_settings()
+    yield server
+    server.invalidate_settings()
+
+
+def test_settings_revalidate_with_304(settings, admin):
+    first = admin.get("/api/settings")
+    assert first.status_code == 200
+    assert first.get_json()["webhook_enabled"] is True
+    assert first.headers["Cache-Control"] == "private, no-cache"
+    etag = first.headers["ETag"]
+
+    again = admin.get("/api/settings", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.get_data() == b""
+    assert again.headers["ETag"] == etag
+
+
+def test_saving_changes_the_etag(settings, admin):
+    etag = admin.get("/api/settings").headers["ETag"]
+    saved = admin.post("/api/settings", json={"webhook_enabled": False, "bot_main_url": "https://t.me/main",
+                                              "bot_alt_url": " https://t.me/alt "})
+    assert saved.status_code == 200
+
+    resp = admin.get("/api/settings", headers={"If-None-Match": etag})
+    assert resp.status_code == 200
+    assert resp.headers["ETag"] != etag
+    assert resp.get_json() == {"webhook_enabled": False, "bot_main_url": "https://t.me/main",
+                               "bot_alt_url": "https://t.me/alt"}
+
+
+def test_other_workers_see_changes_after_the_ttl(settings, admin, monkeypatch):
+    monkeypatch.setattr(settings, "SETTINGS_CACHE_TTL", 0)
+    etag = admin.get("/public/bot-link").headers["ETag"]
+    # another worker saves: only Mongo changes here
+    settings.settings_collection.update_one({}, {"$set": {"webhook_enabled": False},
+                                                  "$inc": {"version": 1}}, upsert=True)
+    resp = admin.get("/public/bot-link", headers={"If-None-Match": etag})
+    assert resp.status_code == 200
+    assert resp.get_json() == {"url": "https://t.me/AlternateBot"}
+
+
+def test_public_bot_link_is_publicly_cacheable(settings, server):
+    client = server.app.test_client()
+    resp = client.get("/public/bot-link")
+    assert resp.get_json() == {"url": "https://t.me/AiSiva_bot"}
+    assert resp.headers["Cache-Control"] == server.PUBLIC_CACHE_CONTROL
+    assert client.get("/public/bot-link", headers={"If-None-Match": resp.headers["ETag"]}).status_code == 304
+
+
+def test_saving_requires_login(settings, server):
+    assert server.app.test_client().post("/api/settings", json={}).status_code == 401
@@ -0,0 +1,115 @@
+import threading
+import time
+
+import pytest
+
+from utils.telegram_queue import PRIORITY_BULK, PRIORITY_INTERACTIVE, TelegramSendQueue, TokenBucket
+
+
+class FakeClient:
+    """Records calls; `responses` (method → list of (status, body)) are served first."""
+
+    def __init__(self, responses=None, delay=0.0):
+        self.responses = responses or {}
+        self.delay = delay
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def call(self, method, payload, retries=None):
+        time.sleep(self.delay)
+        with self.lock:
+            self.calls.append((method, dict(payload), retries))
+            queued = self.responses.get(method)
+            if queued:
+                return queued.pop(0)
+        return 200, {"ok": True, "result": {"message_id": len(self.calls)}}
+
+
+class FakeStore:
+    def __init__(self):
+        self.docs = []
+
+    def insert_many(self, docs):
+        self.docs.extend(docs)
+
+
+def test_token_bucket_rate_and_burst():
+    bucket = TokenBucket(rate=2, burst=2)
+    now = bucket.updated
+    bucket.take(now)
+    bucket.take(now)
+    assert bucket.wait_time(now) == pytest.approx(0.5)
+    assert bucket.wait_time(now + 0.5) == 0
+    assert bucket.wait_time(now + 100) == 0 and bucket.tokens == 2
+
+
+def test_token_bucket_pause():
+    bucket = TokenBucket(rate=1, burst=3)
+    now = bucket.updated
+    bucket.pause(now, 5)
+    assert bucket.wait_time(now) == pytest.approx(5)
+    assert bucket.wait_time(now + 5) == 0
+
+
+def test_interactive_lane_overtakes_bulk():
+    client = FakeClient()
+    q = TelegramSendQueue(client, senders=1)
+    # queue everything before the sender starts so the lanes compete
+    for chat in range(3):
+        q.send_message(100 + chat, "bulk", priority=PRIORITY_BULK)
+    last = q.send_message(7, "reply", priority=PRIORITY_INTERACTIVE)
+    q.start()
+    last.result(timeout=5)
+    assert client.calls[0][1]["text"] == "reply"
+
+
+def test_one_chat_is_delivered_in_order():
+    client = FakeClient()
+    q = TelegramSendQueue(client, senders=4, chat_rate=1000, chat_burst=1000)
+    futures = [q.send_message(1, str(i)) for i in range(20)]
+    q.start()
+    for f in futures:
+        f.result(timeout=5)
+    assert [p["text"] for _, p, _ in client.calls] == [str(i) for i in range(20)]
+
+
+def test_rate_limit_is_retried_by_the_queue_only():
+    client = FakeClient({"sendMessage": [(429, {"ok": False, "parameters": {"retry_after": 0.3}})]})
+    q = TelegramSendQueue(client, senders=1)
+    q.start()
+    started = time.monotonic()
+    status, _ = q.send_message(1, "hi").result(timeout=5)
+    assert status == 200
+    assert time.monotonic() - started >= 0.3
+    assert [r for _, _, r in client.calls] == [0, 0]
+    assert q.stats()["retried"] == 1
+
+
+def test_failures_are_dead_lettered():
+    store = FakeStore()
+    client = FakeClient({"sendMessage": [(400, {"ok": False, "description": "chat not found"})]})
+    q = TelegramSendQueue(client, store=store, senders=1)
+    q.start()
+    status, _ = q.send_message(1, "hi").result(timeout=5)
+    assert status == 400
+    assert store.docs[0]["status"] == "failed" and store.docs[0]["error"] == "chat not found"
+    assert q.stats()["dead_lettered"] == 1
+
+
+def test_not_modified_edit_counts_as_sent():
+    store = FakeStore()
+    client = FakeClient({"editMessageText": [
+        (400, {"ok": False, "description": "Bad Request: message is not modified"})]})
+    q = TelegramSendQueue(client, store=store, senders=1)
+    q.start()
+    status, _ = q.send("editMessageText", {"chat_id": 1, "message_id": 3, "text": "x"}).result(timeout=5)
+    assert status == 200 and store.docs == [] and q.stats()["failed"] == 0
+
+
+def test_numeric_chat_ids_are_normalized():
+    client = FakeClient()
+    q = TelegramSendQueue(client, senders=1)
+    q.start()
+    q.send_message("-100123", "a").result(timeout=5)
+    q.send_message("@channel", "b").result(timeout=5)
+    assert [p["chat_id"] for _, p, _ in client.calls] == [-100123, "@channel"]
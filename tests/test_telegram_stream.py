@@ -0,0 +1,76 @@
+from concurrent.futures import Future
+
+from utils.telegram_stream import TELEGRAM_TEXT_LIMIT, TelegramStreamWriter
+
+
+class FakeQueue:
+    def __init__(self, edit_status=200):
+        self.calls = []
+        self.edit_status = edit_status
+
+    @staticmethod
+    def _done(result):
+        f = Future()
+        f.set_result(result)
+        return f
+
+    def send_message(self, chat_id, text, parse_mode=None, priority=0, **_):
+        self.calls.append(("sendMessage", text, parse_mode))
+        return self._done((200, {"result": {"message_id": 42}}))
+
+    def send(self, method, payload, priority=0):
+        self.calls.append((method, payload["text"], payload.get("parse_mode")))
+        return self._done((self.edit_status, {}))
+
+
+def test_nothing_streamed_sends_one_message():
+    q = FakeQueue()
+    TelegramStreamWriter(q, 1).finish("hello", parse_mode="Markdown")
+    assert q.calls == [("sendMessage", "hello", "Markdown")]
+
+
+def test_edits_are_throttled_and_final_text_applied():
+    q = FakeQueue()
+    w = TelegramStreamWriter(q, 1, min_interval=60)
+    for part in ["Hel", "lo", " world"]:
+        w.feed(part)
+    w.finish("Hello world!")
+    assert q.calls == [("sendMessage", "Hel", None), ("editMessageText", "Hello world!", None)]
+
+
+def test_identical_plain_text_skips_final_edit():
+    q = FakeQueue()
+    w = TelegramStreamWriter(q, 1, min_interval=0)
+    w.feed("Hello world")
+    w.finish("Hello world", parse_mode="Markdown")
+    assert q.calls == [("sendMessage", "Hello world", None)]
+
+
+def test_markup_is_rendered_by_final_edit_with_plain_fallback():
+    q = FakeQueue(edit_status=400)
+    w = TelegramStreamWriter(q, 1, min_interval=0)
+    w.feed("Pay is *500*")
+    w.finish("Pay is *500* USD", parse_mode="Markdown")
+    assert q.calls[1:] == [("editMessageText", "Pay is *500* USD", "Markdown"),
+                           ("editMessageText", "Pay is *500* USD", None)]
+
+
+def test_long_text_overflows_into_follow_ups():
+    q = FakeQueue()
+    w = TelegramStreamWriter(q, 1)
+    text = "x" * (TELEGRAM_TEXT_LIMIT + 10)
+    w.finish(text)
+    assert [len(t) for _, t, _ in q.calls] == [TELEGRAM_TEXT_LIMIT, 10]
+
+
+def test_undelivered_final_edit_does_not_block_or_raise():
+    class StuckQueue(FakeQueue):
+        def send(self, method, payload, priority=0):
+            self.calls.append((method, payload["text"], payload.get("parse_mode")))
+            return Future()  # rate-limited: never resolves within the test
+
+    q = StuckQueue()
+    w = TelegramStreamWriter(q, 1, min_interval=0)
+    w.feed("Hello")
+    w.finish("Hello *world*", parse_mode="Markdown", timeout=0.01)
+    assert q.calls[-1] == ("editMessageText", "Hello *world*", "Markdown")
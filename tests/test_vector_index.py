@@ -0,0 +1,140 @@
+import numpy as np
+import pytest
+
+from utils.vector_index import FlatSearch, IVFSearch, VectorIndex, make_backend, normalize
+
+
+def rows(n, dim=16, seed=0, doc="d1", start=0):
+    rng = np.random.default_rng(seed)
+    return [{"_id": f"{doc}-{start + i}", "embedding": rng.normal(size=dim).tolist(),
+             "text": f"chunk {start + i}", "doc_id": doc} for i in range(n)]
+
+
+def test_search_returns_best_match_first():
+    data = rows(50)
+    index = VectorIndex(FlatSearch())
+    index.reset(data)
+    hits = index.search(data[7]["embedding"], k=3)
+    assert hits[0][1]["text"] == "chunk 7"
+    assert hits[0][0] == pytest.approx(1.0, abs=1e-5)
+    assert [h[0] for h in hits] == sorted((h[0] for h in hits), reverse=True)
+
+
+def test_rows_without_embedding_are_skipped():
+    index = VectorIndex()
+    index.reset([{"_id": 1, "embedding": [], "text": "a"},
+                 {"_id": 2, "embedding": np.ones(4, dtype=np.float32), "text": "b"}])
+    assert len(index) == 1
+    assert index.rows() == [{"_id": "2", "text": "b", "name": None, "doc_id": None}]
+
+
+def test_replace_swaps_one_doc():
+    index = VectorIndex()
+    index.reset(rows(10, doc="a") + rows(10, doc="b", seed=1))
+    new = rows(3, doc="a", seed=2, start=100)
+    assert index.replace(lambda m: m["doc_id"] == "a", new) == 3
+    docs = [r["doc_id"] for r in index.rows()]
+    assert docs.count("a") == 3 and docs.count("b") == 10
+    assert index.search(new[1]["embedding"], k=1)[0][1]["text"] == "chunk 101"
+
+
+def test_save_load_roundtrip(tmp_path):
+    path = str(tmp_path / "index.json")
+    data = rows(30)
+    index = VectorIndex()
+    index.reset(data)
+    index.save(path)
+
+    loaded = VectorIndex()
+    assert loaded.load_file(path)
+    assert len(loaded) == 30 and loaded.version == index.version
+    assert loaded.rows() == index.rows()
+    assert loaded.search(data[3]["embedding"], k=1)[0][1]["text"] == "chunk 3"
+
+
+def test_load_missing_file(tmp_path):
+    assert not VectorIndex().load_file(str(tmp_path / "nope.json"))
+
+
+def test_writes_to_memory_mapped_snapshot(tmp_path):
+    path = str(tmp_path / "index.json")
+    index = VectorIndex()
+    index.reset(rows(20))
+    index.save(path)
+
+    mapped = VectorIndex()
+    mapped.load_file(path, mmap=True)
+    assert mapped.remove(lambda m: m["text"] in ("chunk 0", "chunk 1")) == 2
+    mapped.add(rows(1, seed=5, start=50))
+    assert len(mapped) == 19
+    # the snapshot on disk is untouched
+    again = VectorIndex()
+    again.load_file(path)
+    assert len(again) == 20
+
+
+def test_save_keeps_only_latest_version(tmp_path):
+    path = str(tmp_path / "index.json")
+    index = VectorIndex()
+    index.reset(rows(5))
+    index.save(path)
+    index.add(rows(5, seed=1, start=5))
+    index.save(path)
+    assert len(list(tmp_path.glob("index.*.npy"))) == 1
+
+
+def test_refresh_picks_up_other_writers(tmp_path):
+    path = str(tmp_path / "index.json")
+    writer, reader = VectorIndex(), VectorIndex()
+    writer.reset(rows(5))
+    writer.save(path)
+    reader.load_file(path)
+    assert not reader.refresh(path, min_interval=0)
+
+    writer.add(rows(2, seed=1, start=5))
+    writer.save(path)
+    assert reader.refresh(path, min_interval=0)
+    assert len(reader) == 7
+
+
+def test_ivf_matches_flat_when_probing_every_bucket():
+    data = rows(3000, dim=32)
+    flat, ivf = VectorIndex(FlatSearch()), VectorIndex(IVFSearch(nprobe=1000, min_rows=100))
+    flat.reset(data)
+    ivf.reset(data)
+    q = np.random.default_rng(9).normal(size=32)
+    assert [m["text"] for _, m in ivf.search(q, k=10)] == [m["text"] for _, m in flat.search(q, k=10)]
+
+
+def test_ivf_inverted_lists_follow_adds_and_removes():
+    backend = IVFSearch(nprobe=4, min_rows=100)
+    index = VectorIndex(backend)
+    index.reset(rows(400, dim=16))
+    index.remove(lambda m: int(m["text"].split()[1]) % 3 == 0)
+    index.add(rows(50, dim=16, seed=3, start=1000))
+    n = len(index)
+    assert backend.offsets[-1] == n == len(backend.assign)
+    assert sorted(backend.lists.tolist()) == list(range(n))
+    for c in range(len(backend.centroids)):
+        members = backend.lists[backend.offsets[c]:backend.offsets[c + 1]]
+        assert (backend.assign[members] == c).all()
+
+    q = normalize(np.random.default_rng(4).normal(size=16))
+    probe = np.argpartition(-(backend.centroids @ q), 3)[:4]
+    expected = np.flatnonzero(np.isin(backend.assign, probe))
+    assert backend.candidates(None, q).tolist() == expected.tolist()
+
+
+def test_ivf_state_survives_save_load(tmp_path):
+    path = str(tmp_path / "index.json")
+    index = VectorIndex(IVFSearch(min_rows=100))
+    index.reset(rows(300))
+    index.save(path)
+    loaded = VectorIndex(IVFSearch(min_rows=100))
+    loaded.load_file(path)
+    assert np.array_equal(loaded.backend.lists, index.backend.lists)
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        make_backend("hnsw")
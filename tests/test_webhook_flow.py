@@ -0,0 +1,34 @@
+import pytest
+
+from utils.session_cache import SessionCache
+
+
+@pytest.fixture
+def bot(server, monkeypatch):
+    sent = []
+    monkeypatch.setattr(server, "tg_send_message", lambda chat_id, text, **kw: sent.append(text))
+    cache = SessionCache(server.sessions_coll, mode="cas")
+    monkeypatch.setattr(server, "session_cache", cache)
+    server.sessions_coll.delete_many({})
+    return sent
+
+
+def test_conflicting_update_is_replayed_without_duplicate_messages(server, bot, monkeypatch):
+    server.set_state(7, state="awaiting_platform", language="English")
+    get_state = server.get_state
+    calls = []
+
+    def racing_get_state(chat_id):
+        st = get_state(chat_id)
+        if not calls:
+            # another process touches the session between our read and our write
+            server.sessions_coll.update_one({"chat_id": chat_id}, {"$inc": {"version": 1}})
+        calls.append(chat_id)
+        return st
+
+    monkeypatch.setattr(server, "get_state", racing_get_state)
+    server.handle_webhook_update(7, "Android", {})
+
+    assert len(calls) == 2
+    assert len(bot) == 3   # download link, signup video, app id prompt: once each
+    assert server.get_state(7)["state"] == "awaiting_app_id"